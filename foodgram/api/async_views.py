@@ -0,0 +1,66 @@
+from functools import wraps
+
+from django.http import HttpResponseNotAllowed, JsonResponse
+from foodgram_backend.catalogue import ingredient_catalogue
+from foodgram_backend.models import Tag
+from rest_framework.exceptions import NotFound
+
+from foodgram.constants import CACHE_MAX_AGE, VERSION_CHECK_TTL
+
+from .conditional import async_conditional, database_sync_to_async
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def not_found():
+    return json_response({'detail': str(NotFound.default_detail)},
+                         status=404)
+
+
+def require_safe(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(('GET', 'HEAD'))
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_safe
+@async_conditional(['tags'], public=True, max_age=CACHE_MAX_AGE)
+async def tag_list(request):
+    return json_response(await database_sync_to_async(list)(
+        Tag.objects.values(*TAG_FIELDS)))
+
+
+@require_safe
+@async_conditional(['tags'], public=True, max_age=CACHE_MAX_AGE)
+async def tag_detail(request, pk):
+    tag = await database_sync_to_async(
+        Tag.objects.filter(pk=pk).values(*TAG_FIELDS).first)()
+    return json_response(tag) if tag else not_found()
+
+
+@require_safe
+@async_conditional(['ingredients'], versions_ttl=VERSION_CHECK_TTL,
+                   public=True, max_age=CACHE_MAX_AGE)
+async def ingredient_list(request):
+    name = request.GET.get('name')
+    if name:
+        return json_response(
+            await database_sync_to_async(ingredient_catalogue.search)(name))
+    return json_response(
+        await database_sync_to_async(ingredient_catalogue.all)())
+
+
+@require_safe
+@async_conditional(['ingredients'], versions_ttl=VERSION_CHECK_TTL,
+                   public=True, max_age=CACHE_MAX_AGE)
+async def ingredient_detail(request, pk):
+    ingredient = await database_sync_to_async(ingredient_catalogue.get)(pk)
+    return json_response(ingredient) if ingredient else not_found()
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.constants import TOKEN_CACHE_TTL
+
+
+class TokenCache:
+    """
+    Кеш токенов авторизации.
+
+    Хранится в общем для всех процессов кеше из настройки
+    TOKEN_CACHE_ALIAS, поэтому выход или смена пароля отзывают
+    токен сразу во всех процессах. TOKEN_CACHE_TTL ограничивает
+    жизнь записи, если токен удалили в обход сигналов.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.TOKEN_CACHE_ALIAS]
+
+    def key(self, key):
+        return f'token:{key}'
+
+    def get(self, key):
+        return self.cache.get(self.key(key))
+
+    def set(self, key, token):
+        self.cache.set(self.key(key), token, TOKEN_CACHE_TTL)
+
+    def invalidate(self, keys):
+        self.cache.delete_many([self.key(key) for key in keys])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Авторизация по токену без запроса к базе для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        return token.user, token
@@ -0,0 +1,86 @@
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+from foodgram_backend.models import Recipe, Subscribe
+from foodgram_backend.versions import data_versions
+
+from .serializers import RecipeReadSerializer
+
+
+class RecipeCache:
+    """
+    Кеш представления рецептов.
+
+    Хранит общую для всех пользователей часть ответа: автора,
+    теги, ингредиенты и текст. Ключ содержит версию поколения
+    recipes (меняется при правке тегов и ингредиентов) и версию
+    рецепта (меняется при правке самого рецепта). Флаги is_favorited,
+    is_in_shopping_cart и is_subscribed подставляются
+    при каждом запросе.
+    """
+
+    @property
+    def cache(self):
+        return caches['recipes']
+
+    def bump_generation(self):
+        data_versions.bump(['recipes'])
+
+    def invalidate(self, pks):
+        data_versions.bump([f'recipe:{pk}' for pk in pks])
+
+    def get_keys(self, pks, host, versions=None):
+        """Ключи кеша; уже прочитанные версии берутся из versions."""
+        versions = dict(versions or {})
+        missing = [name for name in ('recipes',
+                                     *(f'recipe:{pk}' for pk in pks))
+                   if name not in versions]
+        if missing:
+            versions.update(data_versions.get_many(missing))
+        generation = versions['recipes'][0]
+        return {pk: f'recipe:{generation}:{pk}:'
+                    f'{versions[f"recipe:{pk}"][0]}:{host}'
+                for pk in pks}
+
+    def represent(self, recipes, context):
+        """Представление рецептов с флагами текущего пользователя."""
+        request = context['request']
+        keys = self.get_keys([recipe.pk for recipe in recipes],
+                             request.build_absolute_uri('/'),
+                             getattr(request, 'versions', None))
+        cached = self.cache.get_many(keys.values())
+        missing = [recipe for recipe in recipes
+                   if keys[recipe.pk] not in cached]
+        if missing:
+            prefetch_related_objects(missing,
+                                     *Recipe.objects.related_lookups())
+            for recipe in missing:
+                recipe.author.is_subscribed = False
+            data = RecipeReadSerializer(missing, many=True,
+                                        context=context).data
+            fresh = {keys[recipe.pk]: item
+                     for recipe, item in zip(missing, data)}
+            cached.update(fresh)
+            # Пока копии изображения не готовы, image_variants пуст:
+            # такое представление не кешируем.
+            self.cache.set_many({key: item for key, item in fresh.items()
+                                 if item['image_variants']})
+        return self.overlay(recipes, [cached[keys[recipe.pk]]
+                                      for recipe in recipes], request.user)
+
+    def overlay(self, recipes, data, user):
+        subscribed = set()
+        if user.is_authenticated:
+            subscribed = set(Subscribe.objects.filter(
+                user=user,
+                author__in={recipe.author_id for recipe in recipes}
+            ).values_list('author', flat=True))
+        for recipe, item in zip(recipes, data):
+            item['is_favorited'] = getattr(recipe, 'is_favorited', False)
+            item['is_in_shopping_cart'] = getattr(
+                recipe, 'is_in_shopping_cart', False)
+            item['author']['is_subscribed'] = (recipe.author_id
+                                               in subscribed)
+        return data
+
+
+recipe_cache = RecipeCache()
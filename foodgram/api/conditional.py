@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import sha256
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from foodgram_backend.versions import data_versions
+
+
+def versions_etag(versions):
+    tokens = [f'{name}:{token}' for name, (token, _) in sorted(
+        versions.items())]
+    return sha256(' '.join(tokens).encode()).hexdigest()
+
+
+def versions_modified(versions):
+    return max(modified for _, modified in versions.values())
+
+
+def patch_response(response, cache_control):
+    if response.status_code in (200, 304):
+        patch_cache_control(response, **cache_control)
+        if cache_control.get('private'):
+            patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional(get_names, versions_ttl=0, **cache_control):
+    """
+    Условные GET-запросы для метода вьюсета.
+
+    ETag и Last-Modified считаются по версиям данных из
+    get_names(request, **kwargs), поэтому ответ 304 отдаётся
+    без обращения к базе и сериализатора. С versions_ttl версии
+    берутся из памяти процесса, пока им меньше versions_ttl секунд.
+    Параметры cache_control добавляются в заголовок Cache-Control.
+    """
+    def get_versions(request, **kwargs):
+        if not hasattr(request, 'versions'):
+            request.versions = data_versions.get_many(
+                get_names(request, **kwargs), versions_ttl)
+        return request.versions
+
+    def etag(request, *args, **kwargs):
+        return versions_etag(get_versions(request, **kwargs))
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            versions_modified(get_versions(request, **kwargs)),
+            tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag,
+                                     last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return patch_response(conditional_view(request, *args, **kwargs),
+                                  cache_control)
+        return wrapper
+    return method_decorator(decorator)
+
+
+def database_sync_to_async(func):
+    """
+    Запросы к базе из асинхронного представления.
+
+    Django 3.2 выполняет синхронные представления и вызовы
+    sync_to_async(thread_sensitive=True) в одном общем потоке
+    процесса, поэтому они ждут друг друга. Здесь func выполняется
+    в пуле потоков (thread_sensitive=False), а соединение потока
+    проверяется до и после вызова, как в начале и конце запроса.
+    """
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(inner, thread_sensitive=False)
+
+
+def async_conditional(names, versions_ttl=0, **cache_control):
+    """То же для асинхронных представлений с постоянным набором версий."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            versions = versions_ttl and data_versions.get_cached(
+                names, versions_ttl)
+            if not versions:
+                versions = await database_sync_to_async(
+                    data_versions.get_many)(names)
+            etag = quote_etag(versions_etag(versions))
+            last_modified = int(versions_modified(versions))
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response['ETag'] = etag
+                    response['Last-Modified'] = http_date(last_modified)
+            return patch_response(response, cache_control)
+        return wrapper
+    return decorator
@@ -1,14 +1,6 @@
 from django_filters import rest_framework
-
-from foodgram_backend.models import Ingredient, Recipe, Tag
-
-
-class IngredientFilter(rest_framework.FilterSet):
-    name = rest_framework.CharFilter(field_name='name')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from foodgram_backend.models import Recipe, Tag
+from foodgram_backend.search import search_recipes
 
 
 class RecipeFilter(rest_framework.FilterSet):
@@ -31,6 +23,11 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = rest_framework.CharFilter(method='filter_search')
+    ordering = rest_framework.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -46,3 +43,9 @@ class RecipeFilter(rest_framework.FilterSet):
         if value:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-popularity', '-pk')
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -1,9 +1,135 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from foodgram.constants import PAGE_SIZE
 
 
 class FoodgramPagination(PageNumberPagination):
+    """
+    Пагинация.
+
+    По умолчанию постраничная (page/limit). С параметром cursor
+    включается keyset-режим: страница выбирается условием по полям
+    сортировки кверисета и первичному ключу, без COUNT и OFFSET.
+    """
+
     page_size = PAGE_SIZE
     page_query_param = 'page'
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_mode(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.keys = self.get_keys(queryset)
+        queryset = queryset.order_by(
+            *(f'-{field}' if desc else field for field, desc in self.keys)
+        )
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(cursor))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.last_position = (
+            [self.get_value(results[-1], field) for field, _ in self.keys]
+            if results else None
+        )
+        return results
+
+    def is_cursor_mode(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.last_position))
+
+    def get_keys(self, queryset):
+        """Поля сортировки кверисета, дополненные первичным ключом."""
+        ordering = (queryset.query.order_by
+                    or queryset.model._meta.ordering)
+        keys = [(field.lstrip('-'), field.startswith('-'))
+                for field in ordering]
+        if not {'pk', queryset.model._meta.pk.name} & {
+                field for field, _ in keys}:
+            keys.append(('pk', keys[-1][1] if keys else False))
+        return keys
+
+    def get_keyset_filter(self, values):
+        """
+        Условие «после курсора» по полям сортировки.
+
+        Условие через OR индекс не ограничивает, поэтому к нему
+        добавлена граница по первому полю (<= или >=): по ней
+        PostgreSQL начинает чтение индекса сразу с позиции курсора.
+        """
+        condition, equal = Q(), Q()
+        for (field, desc), value in zip(self.keys, values):
+            lookup = f'{field}__lt' if desc else f'{field}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{field: value})
+        (field, desc), value = self.keys[0], values[0]
+        bound = Q(**{f'{field}__lte' if desc else f'{field}__gte': value})
+        return bound & condition
+
+    def get_value(self, obj, field):
+        if field == 'pk':
+            return obj.pk
+        try:
+            return getattr(obj, obj._meta.get_field(field).attname)
+        except FieldDoesNotExist:
+            # Аннотация кверисета, например rank при поиске.
+            return getattr(obj, field)
+
+    def encode_cursor(self, values):
+        data = json.dumps(values, default=str).encode()
+        return urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class FeedPagination(FoodgramPagination):
+    """Пагинация ленты: всегда keyset, номер страницы не поддерживается."""
+
+    def is_cursor_mode(self, request):
+        return True
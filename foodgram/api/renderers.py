@@ -0,0 +1,139 @@
+import csv
+import json
+from io import BytesIO
+from itertools import chain
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_LEADING = 16
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def error_text(data):
+    """Текст ответа с ошибкой: {'detail': ...} или ошибки полей."""
+    if isinstance(data, dict):
+        return '\n'.join(
+            error_text(value) if key == 'detail'
+            else f'{key}: {error_text(value)}'
+            for key, value in data.items()
+        )
+    if isinstance(data, (list, tuple)):
+        return '\n'.join(error_text(value) for value in data)
+    return str(data)
+
+
+def ingredient_line(ingredient):
+    return (f'{ingredient["name"]} ({ingredient["measurement_unit"]})'
+            f' - {ingredient["amount"]}')
+
+
+class ShoppingListTextRenderer(BaseRenderer):
+    """Список покупок в виде текста."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return error_text(data)
+
+    def stream(self, ingredients):
+        yield 'Список ингредиентов:'
+        for ingredient in ingredients:
+            yield f'\n{ingredient_line(ingredient)}'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Единица измерения',
+                               'Количество'))
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['name'],
+                                   ingredient['measurement_unit'],
+                                   ingredient['amount']))
+
+
+class ShoppingListJSONRenderer(JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def stream(self, ingredients):
+        yield '['
+        for index, ingredient in enumerate(ingredients):
+            yield (',' if index else '') + json.dumps({
+                'name': ingredient['name'],
+                'measurement_unit': ingredient['measurement_unit'],
+                'amount': ingredient['amount']
+            }, ensure_ascii=False)
+        yield ']'
+
+
+class ShoppingListPDFRenderer(BaseRenderer):
+    """
+    Список покупок в формате PDF.
+
+    Строки читаются из курсора по одной и выводятся на страницу,
+    но документ целиком собирается в памяти: reportlab записывает
+    PDF только в canvas.save(), вместе с подмножеством шрифта
+    и таблицей ссылок. Частями отдаётся уже готовый файл, поэтому
+    первый байт уходит клиенту после отрисовки всех страниц.
+    Список покупок — одна строка на ингредиент, так что документ
+    ограничен размером справочника и занимает десятки килобайт.
+    Шрифт из настройки PDF_FONT встраивается в файл, чтобы
+    кириллица читалась без шрифтов клиента.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.document(error_text(data).splitlines()))
+
+    def stream(self, ingredients):
+        return self.document(chain(
+            ['Список ингредиентов:'],
+            (ingredient_line(ingredient) for ingredient in ingredients)
+        ))
+
+    def document(self, lines):
+        if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, settings.PDF_FONT))
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        text = None
+        for line in lines:
+            if text is None or text.getY() < PDF_MARGIN:
+                if text is not None:
+                    canvas.drawText(text)
+                    canvas.showPage()
+                text = canvas.beginText(PDF_MARGIN, A4[1] - PDF_MARGIN)
+                text.setFont(PDF_FONT_NAME, PDF_FONT_SIZE, PDF_LEADING)
+            text.textLine(line)
+        if text is not None:
+            canvas.drawText(text)
+        # Весь документ записывается в buffer здесь, а не по страницам.
+        canvas.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
@@ -1,65 +1,24 @@
+from collections import Counter
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.validators import UniqueTogetherValidator
 
 from foodgram.constants import MAX_VALUE_AND_LENGTH, MIN_VALUE
-from foodgram_backend.models import (Favourites, Ingredient,
-                                     IngredientInRecipe, Recipe, ShoppingCart,
-                                     Subscribe, Tag)
+from foodgram_backend.models import (Ingredient, IngredientInRecipe, Recipe,
+                                     ShoppingListItem, Tag)
+from foodgram_backend.catalogue import ingredient_catalogue
+from foodgram_backend.images import image_pipeline
+from foodgram_backend.pantry import ingredient_recipe_index
 
 User = get_user_model()
 
 
-class CreateFavoriteSerializer (serializers.ModelSerializer):
-    """Сериализатор для создания подписки."""
-
-    class Meta:
-        model = Favourites
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        if not self.context.get('request').method == 'POST':
-            return data
-        if Favourites.objects.filter(
-                user=data['user'],
-                recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное')
-        return data
-
-    def to_representation(self, instance):
-        return RecipeMiniSerializer(instance.recipe, context={
-            'request': self.context.get('request')
-        }).data
-
-
-class CreateShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания корзины покупок."""
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        if not self.context.get('request').method == 'POST':
-            return data
-        if ShoppingCart.objects.filter(
-            user=data['user'],
-            recipe=data['recipe']
-        ).exists():
-            raise ValidationError('Рецепт уже добавлен в корзину')
-        return data
-
-    def to_representation(self, instance):
-        return RecipeMiniSerializer(instance.recipe, context={
-            'request': self.context.get('request')
-        }).data
-
-
 class UserSerializer(UserSerializer):
     """Сериализатор для модели Юзер."""
 
@@ -74,6 +33,8 @@ class UserSerializer(UserSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_authenticated and (user.follower
                                       .filter(author=obj.id).exists()):
@@ -120,6 +81,31 @@ class PasswordSerializer(serializers.ModelSerializer):
         return value
 
 
+class ImageVariantsField(serializers.Field):
+    """
+    Уменьшенные копии изображения.
+
+    Для каждого формата строка в виде srcset, пока копии
+    не готовы, возвращается пустой словарь.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='image', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return {}
+        request = self.context.get('request')
+        srcset = {}
+        for width, image_format, name in image_pipeline.ready_variants(
+                image.name):
+            url = request.build_absolute_uri(image.storage.url(name))
+            srcset.setdefault(image_format, []).append(f'{url} {width}w')
+        return {image_format: ', '.join(urls)
+                for image_format, urls in srcset.items()}
+
+
 class RecipeSubscribeSerializer(serializers.ModelSerializer):
     """
     Вспомогательный.
@@ -128,10 +114,12 @@ class RecipeSubscribeSerializer(serializers.ModelSerializer):
     в подписках.
     """
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name',
                             'image', 'cooking_time')
 
@@ -140,7 +128,7 @@ class SubscribeSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -150,6 +138,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
                   'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_authenticated:
             return obj.following.filter(user=request.user).exists()
@@ -158,42 +148,18 @@ class SubscribeSerializer(serializers.ModelSerializer):
     def get_recipes(self, obj):
         request = self.context.get('request')
         recipes_limit = self.context.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
         serializer = RecipeMiniSerializer(recipes, many=True,
                                           context={
                                               'request': request
                                           })
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class CreateSubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания подписки на юзера."""
-
-    class Meta:
-        model = Subscribe
-        fields = ('user', 'author')
-        validators = [UniqueTogetherValidator(
-            queryset=Subscribe.objects.all(),
-            fields=('user', 'author'),
-            message='Вы уже подписаны на пользователя')]
-
-    def validate(self, data):
-        if data['user'] == data['author']:
-            raise serializers.ValidationError(
-                'Подписаться на себя невозможно'
-            )
-        return data
-
-    def to_representation(self, instance):
-        return SubscribeSerializer(instance.author, context={
-            'request': self.context.get('request')
-        }).data
-
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для Тегов."""
@@ -214,7 +180,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для Ингредиентов в рецепте."""
 
-    id = serializers.IntegerField()
+    id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -228,8 +194,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов в рецепте (создание)."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient
-                                            .objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_VALUE,
         max_value=MAX_VALUE_AND_LENGTH
@@ -248,6 +213,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(many=True,
                                                source='ingredient_in_recipe')
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -257,31 +223,34 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'author', 'ingredients',
                   'is_favorited',
                   'is_in_shopping_cart',
-                  'name', 'image', 'text',
+                  'name', 'image', 'image_variants', 'text',
                   'cooking_time')
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return user.shopping_cart.filter(recipe=obj).exists()
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для POST и PATCH запросов рецепта."""
 
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientRecipeCreateSerializer(many=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField(required=True)
-    cooking_tame = serializers.IntegerField(
+    cooking_time = serializers.IntegerField(
         min_value=MIN_VALUE,
         max_value=MAX_VALUE_AND_LENGTH
     )
@@ -300,13 +269,73 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise ValidationError('Обязательное поле пустое')
         return super().validate(data)
 
-    def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            IngredientInRecipe.objects.create(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
+    def validate_unique_ids(self, ids, known_ids, name):
+        """Проверяет список id на повторы и неизвестные значения."""
+        errors = []
+        duplicates = {pk for pk, count in Counter(ids).items() if count > 1}
+        if duplicates:
+            errors.append(f'{name} повторяются: '
+                          + ', '.join(map(str, sorted(duplicates))))
+        unknown = set(ids) - set(known_ids)
+        if unknown:
+            errors.append(f'{name} не найдены: '
+                          + ', '.join(map(str, sorted(unknown))))
+        if errors:
+            raise ValidationError(errors)
+
+    def validate_tags(self, value):
+        tags = Tag.objects.in_bulk(value)
+        self.validate_unique_ids(value, tags, 'Теги')
+        return [tags[pk] for pk in value]
+
+    def validate_ingredients(self, value):
+        ids = [ingredient['id'] for ingredient in value]
+        self.validate_unique_ids(ids, ingredient_catalogue.in_bulk(ids),
+                                 'Ингредиенты')
+        return value
 
+    def create_ingredients(self, ingredients, recipe):
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe,
+                               ingredient_id=ingredient['id'],
+                               amount=ingredient['amount'])
+            for ingredient in ingredients
+        )
+        ingredient_recipe_index.invalidate([recipe.pk])
+
+    def update_ingredients(self, ingredients, recipe):
+        """Обновляет ингредиенты рецепта по разнице с текущими."""
+        existing = {item.ingredient_id: item
+                    for item in recipe.ingredient_in_recipe.all()}
+        submitted = {ingredient['id']: ingredient['amount']
+                     for ingredient in ingredients}
+        removed = existing.keys() - submitted.keys()
+        if removed:
+            # Без сигналов на каждую строку: списки покупок
+            # пересчитываются ниже одним вызовом.
+            rows = recipe.ingredient_in_recipe.filter(ingredient__in=removed)
+            rows._raw_delete(rows.db)
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = submitted.get(ingredient_id, item.amount)
+            if amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        added = submitted.keys() - existing.keys()
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe,
+                               ingredient_id=ingredient_id,
+                               amount=submitted[ingredient_id])
+            for ingredient_id in added
+        )
+        touched = removed | added | {item.ingredient_id for item in changed}
+        if touched:
+            ShoppingListItem.objects.refresh_recipe(recipe.pk, touched)
+        if removed or added:
+            ingredient_recipe_index.invalidate([recipe.pk])
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context['request'].user
         tags = validated_data.pop('tags')
@@ -314,25 +343,37 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=author, **validated_data)
         self.create_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        self.schedule_image_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, data):
         validated_data = self.validate(data)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        for ingredient in ingredients:
-            object = IngredientInRecipe.objects.get(
-                recipe=instance,
-                ingredient=ingredient['id'])
-            object.amount = ingredient['amount']
-            object.save()
-        instance.tags.clear()
+        self.update_ingredients(ingredients, instance)
         instance.tags.set(tags)
-        instance.save()
-        return super().update(instance,
-                              validated_data)
+        instance = super().update(instance, validated_data)
+        self.schedule_image_variants(instance)
+        return instance
+
+    def schedule_image_variants(self, recipe):
+        """
+        Копии создаются только для нового файла изображения.
+
+        Хранилище называет файл по содержимому, поэтому правка
+        с тем же изображением оставляет прежнее имя.
+        """
+        name = recipe.image.name
+        if recipe.previous_image == name:
+            return
+        transaction.on_commit(lambda: image_pipeline.schedule(name))
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], Prefetch(
+            'ingredient_in_recipe',
+            queryset=IngredientInRecipe.objects.select_related('ingredient')
+        ))
         return RecipeReadSerializer(instance,
                                     context={'request':
                                              self.context['request']}).data
@@ -340,9 +381,12 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeMiniSerializer(serializers.ModelSerializer):
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = ('id',
                   'name',
                   'image',
+                  'image_variants',
                   'cooking_time')
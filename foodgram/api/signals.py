@@ -0,0 +1,75 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from foodgram_backend.models import (Favourites, Ingredient,
+                                     IngredientInRecipe, Recipe, ShoppingCart,
+                                     Subscribe, Tag)
+from foodgram_backend.versions import data_versions
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import token_cache
+from .cache import recipe_cache
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    recipe_cache.invalidate([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    recipe_cache.invalidate([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_cache.invalidate([instance.pk])
+    elif pk_set:
+        recipe_cache.invalidate(pk_set)
+    else:
+        recipe_cache.bump_generation()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_all_recipes(**kwargs):
+    recipe_cache.bump_generation()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    data_versions.bump(['tags'])
+
+
+@receiver((post_save, post_delete), sender=Favourites)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_user_flags(instance, **kwargs):
+    """Флаги избранного, корзины и подписок входят в ETag рецепта."""
+    data_versions.bump([f'user:{instance.user_id}'])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, update_fields=None, **kwargs):
+    """Вход пользователя меняет только last_login, рецепты не трогаем."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    recipe_cache.invalidate(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Выход из системы удаляет токен."""
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    """Смена пароля или деактивация должны сразу отзывать токен."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from foodgram_backend.catalogue import ingredient_catalogue
+from foodgram_backend.images import image_pipeline
+from foodgram_backend.models import (DataVersion, Ingredient,
+                                     IngredientInRecipe, Recipe, Tag)
+from foodgram_backend.pantry import ingredient_recipe_index
+from foodgram_backend.versions import data_versions
+from rest_framework.test import APIClient
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CookTest(TestCase):
+    """Подбор рецептов по обратному индексу ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        cls.tag = Tag.objects.create(name='Обед', color='#00ff00',
+                                     slug='lunch')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Картофель', 'Лук', 'Морковь', 'Свёкла'))
+        cls.recipes = []
+        for name, ingredients in (('Пюре', cls.ingredients[:2]),
+                                  ('Борщ', cls.ingredients)):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=name, text='Текст',
+                cooking_time=10, image='recipes/recipe.gif')
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=10)
+                for ingredient in ingredients)
+            cls.recipes.append(recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        data_versions.read.clear()
+        ingredient_catalogue.version = None
+        ingredient_recipe_index.version = None
+        patcher = mock.patch.object(image_pipeline, 'schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cook(self, *ingredients, **params):
+        return APIClient().get('/api/recipes/cook/', {
+            'ingredients': ','.join(str(ingredient.pk)
+                                    for ingredient in ingredients),
+            **params})
+
+    def patch(self, recipe, ingredients, name='Рецепт'):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with mock.patch('api.serializers.image_pipeline'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/recipes/{recipe.pk}/', {
+                'name': name, 'text': 'Текст', 'cooking_time': 10,
+                'image': 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///'
+                         'yH5BAEAAAAALAAAAAABAAEAAAICRAEAOw==',
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': ingredient.pk, 'amount': 10}
+                                for ingredient in ingredients],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_ranked_with_missing(self):
+        potato, onion, carrot, beet = self.ingredients
+        response = self.cook(potato, onion)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['id'], item['coverage'], item['matched'],
+              [ingredient['name'] for ingredient
+               in item['missing_ingredients']])
+             for item in response.data['results']],
+            [(self.recipes[0].pk, 1.0, 2, []),
+             (self.recipes[1].pk, 0.5, 2, ['Морковь', 'Свёкла'])])
+
+    def test_queries_do_not_depend_on_page(self):
+        self.cook(self.ingredients[0])
+        for limit in (1, 2):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(5):
+                    response = self.cook(self.ingredients[0], limit=limit)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_text_edit_keeps_index(self):
+        self.patch(self.recipes[0], self.ingredients[:2])
+        versions = dict(DataVersion.objects.values_list('name', 'version'))
+        self.patch(self.recipes[0], self.ingredients[:2], name='Пюре')
+        self.assertEqual(
+            dict(DataVersion.objects.filter(
+                name__startswith='recipe_ingredients'
+            ).values_list('name', 'version')),
+            {name: version for name, version in versions.items()
+             if name.startswith('recipe_ingredients')})
+
+    def test_incremental_update(self):
+        potato, onion, carrot, beet = self.ingredients
+        before = ingredient_recipe_index.get()
+        self.patch(self.recipes[0], [beet])
+        after = ingredient_recipe_index.get()
+        self.assertEqual(after.ingredients[self.recipes[0].pk], [beet.pk])
+        # Списки других рецептов не перечитывались.
+        self.assertIs(after.ingredients[self.recipes[1].pk],
+                      before.ingredients[self.recipes[1].pk])
+        self.assertEqual(after.postings[potato.pk], [self.recipes[1].pk])
+        self.assertEqual(sorted(after.postings[beet.pk]),
+                         sorted(recipe.pk for recipe in self.recipes))
+        response = self.cook(beet)
+        self.assertEqual(response.data['results'][0]['id'],
+                         self.recipes[0].pk)
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from foodgram_backend.models import (Ingredient, IngredientInRecipe, Recipe,
+                                     ShoppingCart)
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.test import APIClient
+from users.models import User
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class DownloadShoppingCartTest(TestCase):
+    """Выгрузка списка покупок во всех форматах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Поваров')
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Борщ', text='Текст', cooking_time=60,
+            image='recipes/borscht.gif')
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, amount=100 + i,
+                               ingredient=Ingredient.objects.create(
+                                   name=f'Свёкла {i}', measurement_unit='г'))
+            for i in range(100))
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, client, format=None):
+        response = client.get(URL, {'format': format} if format else {})
+        content = b''.join(response.streaming_content
+                           if response.streaming else [response.content])
+        return response, content
+
+    def test_formats(self):
+        for format, content_type, start in (
+            (None, 'text/plain; charset=utf-8',
+             'Список ингредиентов:\nСвёкла 0 (г) - 100'.encode()),
+            ('csv', 'text/csv; charset=utf-8',
+             'Ингредиент,Единица измерения,Количество'.encode()),
+            ('json', 'application/json; charset=utf-8',
+             '[{"name": "Свёкла 0"'.encode()),
+            ('pdf', 'application/pdf', b'%PDF-'),
+        ):
+            with self.subTest(format=format):
+                response, content = self.download(self.client, format)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertTrue(content.startswith(start), content[:60])
+
+    def test_pdf_embeds_font(self):
+        _, content = self.download(self.client, 'pdf')
+        self.assertIn(b'/FontFile2', content)
+        self.assertIn(b'/Count 3', content)
+
+    def test_errors_are_plain_text(self):
+        for client, format, status, text in (
+            (APIClient(), None, 401, NotAuthenticated.default_detail),
+            (self.client, 'xml', 404, NotFound.default_detail),
+        ):
+            with self.subTest(status=status):
+                response, content = self.download(client, format)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(content.decode(), str(text))
+
+    def test_empty_cart(self):
+        ShoppingCart.objects.all().delete()
+        response, content = self.download(self.client)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(content.decode(), 'Ваша корзина пуста')
@@ -0,0 +1,149 @@
+import base64
+import io
+import shutil
+import tempfile
+from threading import Event, Thread
+from time import sleep
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from foodgram_backend.images import (image_pipeline, render_variants,
+                                     variant_name)
+from foodgram_backend.models import Ingredient, Recipe, Tag
+from PIL import Image
+from rest_framework.test import APIClient
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+       b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+       b'\x02\x02D\x01\x00;')
+OTHER_GIF = GIF.replace(b'\xff\xff\xff', b'\xff\x00\x00')
+
+
+def data_url(content):
+    return 'data:image/gif;base64,' + base64.b64encode(content).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImageTest(TestCase):
+    """Копии изображения создаются только для нового файла."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        cls.tag = Tag.objects.create(name='Обед', color='#00ff00',
+                                     slug='lunch')
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, image, name='Суп'):
+        return {'name': name, 'text': 'Текст', 'cooking_time': 10,
+                'image': data_url(image), 'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 5}]}
+
+    def send(self, method, url, payload):
+        with mock.patch('api.serializers.image_pipeline') as pipeline:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, method)(url, payload,
+                                                        format='json')
+        self.assertIn(response.status_code, (200, 201), response.data)
+        return response, pipeline.schedule
+
+    def test_schedule_only_new_image(self):
+        response, schedule = self.send('post', '/api/recipes/',
+                                       self.payload(GIF))
+        schedule.assert_called_once()
+        url = f'/api/recipes/{response.data["id"]}/'
+        _, schedule = self.send('patch', url, self.payload(GIF, 'Щи'))
+        schedule.assert_not_called()
+        _, schedule = self.send('patch', url, self.payload(OTHER_GIF))
+        schedule.assert_called_once()
+
+    def test_variants_not_wider_than_original(self):
+        for width, widths in ((800, [320, 640, 800]),
+                              (2000, [320, 640, 1280]),
+                              (100, [100])):
+            with self.subTest(width=width):
+                buffer = io.BytesIO()
+                Image.new('RGB', (width, 50), 'red').save(buffer, 'PNG')
+                name = default_storage.save('foodgram_backend/photo.png',
+                                            ContentFile(buffer.getvalue()))
+                with mock.patch.object(image_pipeline, 'schedule') as schedule:
+                    self.assertEqual(image_pipeline.ready_variants(name), [])
+                schedule.assert_called_once_with(name)
+                render_variants(default_storage.path(name))
+                variants = image_pipeline.ready_variants(name)
+                self.assertEqual(
+                    sorted({width for width, _, _ in variants}), widths)
+                for variant_width, _, variant in variants:
+                    with default_storage.open(variant) as file:
+                        with Image.open(file) as image:
+                            self.assertEqual(image.width, variant_width)
+                self.assertEqual(
+                    default_storage.exists(variant_name(name, 1280, 'webp')),
+                    1280 in widths)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Блокировка имени файла в PostgreSQL')
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SharedImageReleaseTest(TransactionTestCase):
+    """Удаление файла ждёт коммита рецепта, который его переиспользует."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_release_while_reused(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        storage = Recipe._meta.get_field('image').storage
+        old = Recipe.objects.create(
+            author=author, name='Старый', text='Текст', cooking_time=10,
+            image=storage.save('foodgram_backend/photo.gif',
+                               ContentFile(GIF)))
+        saved, errors = Event(), []
+
+        def reuse():
+            try:
+                with transaction.atomic():
+                    name = storage.save('foodgram_backend/photo.gif',
+                                        ContentFile(GIF))
+                    saved.set()
+                    # Удаление старого рецепта идёт, пока этот
+                    # рецепт ещё не закоммичен.
+                    sleep(0.5)
+                    Recipe.objects.create(
+                        author=author, name='Новый', text='Текст',
+                        cooking_time=10, image=name)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                saved.set()
+                connections.close_all()
+
+        thread = Thread(target=reuse)
+        thread.start()
+        saved.wait()
+        old.delete()
+        thread.join()
+        if errors:
+            raise errors[0]
+        self.assertTrue(storage.exists(old.image.name))
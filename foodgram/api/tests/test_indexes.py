@@ -0,0 +1,94 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from foodgram_backend.images import image_pipeline
+from foodgram_backend.models import (Favourites, Ingredient,
+                                     IngredientInRecipe, Recipe,
+                                     ShoppingListItem)
+from rest_framework.test import APIClient
+from users.models import User
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN для PostgreSQL')
+class HotPathIndexesTest(TransactionTestCase):
+    """
+    Горячие запросы идут по индексам.
+
+    Последовательное чтение запрещено (enable_seqscan), поэтому
+    на маленьких таблицах проверяется, что подходящий индекс есть
+    и планировщик может его использовать.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Поваров')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(50))
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Текст', cooking_time=10,
+            image='recipes/recipe.gif')
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=self.recipe, ingredient=ingredient,
+                               amount=10)
+            for ingredient in ingredients)
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user=self.user, ingredient=ingredient,
+                             amount=10)
+            for ingredient in ingredients)
+        with connection.cursor() as cursor:
+            for model in (IngredientInRecipe, ShoppingListItem, Recipe,
+                          Favourites):
+                cursor.execute(f'VACUUM ANALYZE {model._meta.db_table}')
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index, index_only=False):
+        plan = queryset.explain()
+        scan = 'Index Only Scan' if index_only else 'Index'
+        self.assertIn(f'using {index}', plan)
+        self.assertIn(scan, plan)
+
+    def test_shopping_list_covering(self):
+        self.assertUsesIndex(
+            ShoppingListItem.objects.filter(user=self.user)
+            .values_list('ingredient', 'amount'),
+            'shopping_list_amount_idx', index_only=True)
+
+    def test_favourite_lookup(self):
+        self.assertUsesIndex(
+            Favourites.objects.filter(user=self.user, recipe=self.recipe),
+            'unique_favourites_user_and_recipe')
+
+    def test_keyset_page(self):
+        """Следующая страница ленты читает индекс с позиции курсора."""
+        Recipe.objects.bulk_create(
+            Recipe(author=self.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=10, image='recipes/recipe.gif')
+            for i in range(10))
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+        client = APIClient()
+        with mock.patch.object(image_pipeline, 'schedule'):
+            url = client.get('/api/recipes/?cursor=&limit=3').data['next']
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(client.get(url).status_code, 200)
+        sql = next(query['sql'] for query in context.captured_queries
+                   if 'LIMIT' in query['sql']
+                   and 'foodgram_backend_recipe' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('using recipe_pub_date_id_idx', plan)
+        self.assertRegex(plan, r'Index Cond: \(.*pub_date <= ')
+
+    def test_popular_page(self):
+        self.assertUsesIndex(
+            Recipe.objects.order_by('-popularity', '-pk')[:6],
+            'recipe_popularity_idx')
@@ -0,0 +1,218 @@
+import base64
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from foodgram_backend.catalogue import ingredient_catalogue
+from foodgram_backend.images import render_variants
+from foodgram_backend.models import (DataVersion, Favourites, Ingredient,
+                                     IngredientInRecipe, Recipe, ShoppingCart,
+                                     ShoppingListItem, Subscribe, Tag)
+from foodgram_backend.versions import data_versions
+from rest_framework.test import APIClient
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+       b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+       b'\x02\x02D\x01\x00;')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeQueriesTest(TestCase):
+    """Число запросов списка и карточки рецепта не зависит от их размера."""
+
+    LIST_QUERIES = {'anonymous': 5, 'authenticated': 6}
+    DETAIL_QUERIES = {'anonymous': 5, 'authenticated': 6}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов')
+        authors = [User.objects.create_user(
+            email=f'author{i}@example.com', username=f'author{i}',
+            first_name='Автор', last_name=str(i)) for i in range(3)]
+        tags = [Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                                   slug=f'tag{i}') for i in range(3)]
+        ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {i}', measurement_unit='г') for i in range(6)]
+        cls.recipes = []
+        for i in range(8):
+            recipe = Recipe(author=authors[i % 3], name=f'Рецепт {i}',
+                            text='Текст', cooking_time=10)
+            recipe.image.save('recipe.gif', ContentFile(GIF), save=False)
+            recipe.save()
+            render_variants(recipe.image.path)
+            recipe.tags.set(tags[:i % 3 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=10)
+                for ingredient in ingredients[:i % 6 + 1])
+            if i % 2:
+                Favourites.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+            cls.recipes.append(recipe)
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def get(self, client, url, queries, status=200, **params):
+        for cache in caches.all():
+            cache.clear()
+        with self.assertNumQueries(queries):
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_list(self):
+        for name, client in self.clients().items():
+            for limit in (2, 6):
+                with self.subTest(client=name, limit=limit):
+                    response = self.get(client, '/api/recipes/',
+                                        self.LIST_QUERIES[name],
+                                        limit=limit)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail(self):
+        for name, client in self.clients().items():
+            for recipe in (self.recipes[0], self.recipes[5]):
+                with self.subTest(client=name, recipe=recipe.pk):
+                    self.get(client, f'/api/recipes/{recipe.pk}/',
+                             self.DETAIL_QUERIES[name])
+
+    def test_detail_not_found(self):
+        """Для несуществующего рецепта версии не читаются и не создаются."""
+        for pk, queries in ((0, 1), ('unknown', 0)):
+            with self.subTest(pk=pk):
+                self.get(APIClient(), f'/api/recipes/{pk}/', queries,
+                         status=404)
+        self.assertFalse(DataVersion.objects.filter(
+            name__in=('recipe:0', 'recipe:unknown')).exists())
+
+
+class IngredientQueriesTest(TestCase):
+    """Подсказки по ингредиентам не ходят в базу между проверками версии."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сода', 'Сахар', 'Перец'))
+
+    def setUp(self):
+        data_versions.read.clear()
+        ingredient_catalogue.version = None
+
+    def test_typeahead(self):
+        client = APIClient()
+        with self.assertNumQueries(2):
+            response = client.get('/api/ingredients/', {'name': 'с'})
+        self.assertEqual(len(response.data), 3)
+        for query in ('со', 'сол', 'пер'):
+            with self.subTest(query=query):
+                with self.assertNumQueries(0):
+                    response = client.get('/api/ingredients/',
+                                          {'name': query})
+                self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = client.get(
+                '/api/ingredients/', {'name': 'пер'},
+                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeUpdateQueriesTest(TestCase):
+    """Число запросов создания и правки не зависит от числа ингредиентов."""
+
+    CREATE_QUERIES = 22
+    UPDATE_QUERIES = {'unchanged': 18, 'amounts': 26, 'replace all': 27}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        cls.tag = Tag.objects.create(name='Обед', color='#00ff00',
+                                     slug='lunch')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(60))
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=10,
+            image='recipes/recipe.gif')
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=cls.recipe, ingredient=ingredient,
+                               amount=10)
+            for ingredient in cls.ingredients[:30])
+        data_versions.write({'recipe_ingredients',
+                             f'recipe_ingredients:{cls.recipe.pk}'})
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f'cook{i}@example.com', username=f'cook{i}',
+                first_name='Повар', last_name=str(i))
+            ShoppingCart.objects.create(user=user, recipe=cls.recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        data_versions.read.clear()
+        ingredient_catalogue.version = None
+        ingredient_catalogue.all()
+
+    def send(self, method, url, ingredients, amount):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        payload = {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'image': 'data:image/gif;base64,' + base64.b64encode(GIF).decode(),
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': ingredient.pk, 'amount': amount}
+                            for ingredient in ingredients],
+        }
+        # Версии записываются после коммита: их запросы тоже считаем.
+        with mock.patch('api.serializers.image_pipeline'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = getattr(client, method)(url, payload, format='json')
+        self.assertIn(response.status_code, (200, 201), response.data)
+
+    def patch(self, ingredients, amount):
+        self.send('patch', f'/api/recipes/{self.recipe.pk}/', ingredients,
+                  amount)
+
+    def test_create(self):
+        self.send('post', '/api/recipes/', self.ingredients[:1], 5)
+        for ingredients in (self.ingredients[:1], self.ingredients[30:]):
+            with self.subTest(ingredients=len(ingredients)):
+                with self.assertNumQueries(self.CREATE_QUERIES):
+                    self.send('post', '/api/recipes/', ingredients, 5)
+
+    def test_update(self):
+        # Первая правка меняет имя файла и создаёт строки версий.
+        self.patch(self.ingredients[:30], 10)
+        for name, ingredients, amount in (
+            ('unchanged', self.ingredients[:30], 10),
+            ('amounts', self.ingredients[:30], 20),
+            ('replace all', self.ingredients[30:], 5),
+        ):
+            with self.subTest(name):
+                with self.assertNumQueries(self.UPDATE_QUERIES[name]):
+                    self.patch(ingredients, amount)
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list('ingredient', 'amount')),
+            {(ingredient.pk, 5) for ingredient in self.ingredients[30:]})
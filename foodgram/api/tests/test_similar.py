@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import TestCase
+from foodgram_backend.images import image_pipeline
+from foodgram_backend.models import Recipe, SimilarRecipe
+from rest_framework.test import APIClient
+from users.models import User
+
+
+class SimilarRecipesTest(TestCase):
+    """Похожие рецепты по заранее посчитанным соседям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        cls.recipes = [Recipe.objects.create(
+            author=author, name=f'Рецепт {i}', text='Текст',
+            cooking_time=10, image=f'recipes/{i}.gif') for i in range(4)]
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe=cls.recipes[0], similar=similar, score=score)
+            for similar, score in ((cls.recipes[1], 0.2),
+                                   (cls.recipes[2], 0.9)))
+
+    def setUp(self):
+        # Файлов изображений нет: не ставим их обработку в очередь.
+        patcher = mock.patch.object(image_pipeline, 'schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ordered_by_score(self):
+        response = APIClient().get(
+            f'/api/recipes/{self.recipes[0].pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['id'] for recipe in response.data],
+                         [self.recipes[2].pk, self.recipes[1].pk])
+
+    def test_without_neighbours(self):
+        response = APIClient().get(
+            f'/api/recipes/{self.recipes[3].pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_unknown_recipe(self):
+        for pk in (0, 'unknown'):
+            with self.subTest(pk=pk):
+                response = APIClient().get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,122 @@
+from threading import Barrier, Thread
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from foodgram_backend.models import Favourites, Recipe, ShoppingCart, Subscribe
+from rest_framework.test import APIClient
+from users.models import User
+
+THREADS = 8
+
+
+def run_parallel(function, count=THREADS):
+    """
+    Вызывает function(index) одновременно из count потоков.
+
+    У каждого потока своё соединение с базой, оно закрывается
+    по завершении потока.
+    """
+    barrier = Barrier(count)
+    results = [None] * count
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = function(index)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections.close_all()
+
+    threads = [Thread(target=worker, args=(index,))
+               for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'INSERT ... ON CONFLICT и DELETE ... RETURNING в PostgreSQL')
+class ParallelToggleTest(TransactionTestCase):
+    """Параллельные добавления и удаления дают одну строку и один счётчик."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов')
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/recipe.gif')
+
+    def assertCounters(self, favorites, cart, followers):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual((recipe.favorites_count, recipe.cart_count,
+                          author.followers_count),
+                         (favorites, cart, followers))
+
+    def test_add(self):
+        for model, fields in (
+            (Favourites, {'user': self.user, 'recipe': self.recipe}),
+            (ShoppingCart, {'user': self.user, 'recipe': self.recipe}),
+            (Subscribe, {'user': self.user, 'author': self.author}),
+        ):
+            with self.subTest(model=model.__name__):
+                results = run_parallel(
+                    lambda index: model.objects.add(**fields))
+                self.assertEqual(
+                    sum(result is not None for result in results), 1)
+                self.assertEqual(model.objects.filter(**fields).count(), 1)
+        self.assertCounters(1, 1, 1)
+
+    def test_remove(self):
+        Favourites.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.assertCounters(1, 1, 1)
+        for model, fields in (
+            (Favourites, {'user': self.user, 'recipe': self.recipe}),
+            (ShoppingCart, {'user': self.user, 'recipe': self.recipe}),
+            (Subscribe, {'user': self.user, 'author': self.author}),
+        ):
+            with self.subTest(model=model.__name__):
+                results = run_parallel(
+                    lambda index: model.objects.remove(**fields))
+                self.assertEqual(
+                    sum(result is not None for result in results), 1)
+                self.assertFalse(model.objects.filter(**fields).exists())
+        self.assertCounters(0, 0, 0)
+
+    def test_api_double_click(self):
+        """Двойной клик: один ответ 201 и один 400 на каждую кнопку."""
+        for url, model in (
+            (f'/api/recipes/{self.recipe.pk}/favorite/', Favourites),
+            (f'/api/recipes/{self.recipe.pk}/shopping_cart/', ShoppingCart),
+            (f'/api/users/{self.author.pk}/subscribe/', Subscribe),
+        ):
+            with self.subTest(url=url):
+                clients = [APIClient() for _ in range(2)]
+                for client in clients:
+                    client.force_authenticate(self.user)
+                statuses = run_parallel(
+                    lambda index: clients[index].post(url).status_code,
+                    count=2)
+                self.assertEqual(sorted(statuses), [201, 400])
+                self.assertEqual(
+                    model.objects.filter(user=self.user).count(), 1)
+                statuses = run_parallel(
+                    lambda index: clients[index].delete(url).status_code,
+                    count=2)
+                self.assertEqual(sorted(statuses), [204, 400])
+                self.assertFalse(
+                    model.objects.filter(user=self.user).exists())
+        self.assertCounters(0, 0, 0)
@@ -1,28 +1,67 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db.models import BooleanField, F, Prefetch, Value
+from django.http import Http404
+from django.http.response import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from foodgram_backend.models import (Favourites, Ingredient,
-                                     IngredientInRecipe, Recipe, ShoppingCart,
-                                     Subscribe, Tag)
+from foodgram.constants import CACHE_MAX_AGE, VERSION_CHECK_TTL
+from foodgram_backend.catalogue import ingredient_catalogue
+from foodgram_backend.models import (Favourites, Ingredient, Recipe,
+                                     ShoppingCart, Subscribe, Tag)
+from foodgram_backend.pantry import cookable_recipes, ingredient_recipe_index
 from users.models import User
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import FoodgramPagination
+from .cache import recipe_cache
+from .conditional import conditional
+from .filters import RecipeFilter
+from .pagination import FeedPagination, FoodgramPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (CreateFavoriteSerializer,
-                          CreateShoppingCartSerializer,
-                          CreateSubscribeSerializer, CreateUserSerializer,
-                          IngredientSerializer, PasswordSerializer,
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from .serializers import (CreateUserSerializer, IngredientSerializer,
+                          PasswordSerializer, RecipeMiniSerializer,
                           RecipeReadSerializer, RecipeSerializer,
                           SubscribeSerializer, TagSerializer, UserSerializer)
 
 
+def relation_error(message):
+    return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+def remove_relation(model, target, pk, **fields):
+    """
+    Удаление из избранного, корзины или подписок одним запросом.
+
+    Если связи не было, отвечаем 400, а если нет и самого
+    объекта (рецепта или автора) — 404.
+    """
+    if model.objects.remove(**fields) is None:
+        get_object_or_404(target, id=pk)
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def recipe_versions(request, pk):
+    """
+    Рецепт зависит от тегов, ингредиентов и флагов пользователя.
+
+    Для несуществующего рецепта сразу отвечаем 404,
+    не вычисляя ETag и Last-Modified.
+    """
+    get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+    names = ['recipes', f'recipe:{pk}', 'recipe_images']
+    if request.user.is_authenticated:
+        names.append(f'user:{request.user.pk}')
+    return names
+
+
 class UserVieWSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     pagination_class = FoodgramPagination
@@ -33,6 +72,13 @@ class UserVieWSet(viewsets.ModelViewSet):
             return CreateUserSerializer
         return UserSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        recipes_limit = self.request.query_params.get('recipes_limit', '')
+        if recipes_limit.isdigit() and int(recipes_limit) > 0:
+            context['recipes_limit'] = int(recipes_limit)
+        return context
+
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -55,51 +101,83 @@ class UserVieWSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        subscribtions = Subscribe.objects.filter(user=user)
-        pages = self.paginate_queryset(subscribtions)
-        serializer = SubscribeSerializer(pages, many=True,
-                                         context={'request': request})
+        context = self.get_serializer_context()
+        recipes = Recipe.objects.all()
+        if 'recipes_limit' in context:
+            recipes = recipes.latest_per_author(context['recipes_limit'])
+        authors = User.objects.filter(following__user=request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+        )
+        pages = self.paginate_queryset(authors)
+        serializer = SubscribeSerializer(pages, many=True, context=context)
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['POST'],
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, pk):
-        context = {'request': request}
-        subscribtion = get_object_or_404(User, id=pk)
-        data = {
-            'user': subscribtion.id,
-            'author': request.user.id
-        }
-        serializer = CreateSubscribeSerializer(data=data,
-                                               context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        author = get_object_or_404(User, id=pk)
+        if author == request.user:
+            raise relation_error('Подписаться на себя невозможно')
+        if Subscribe.objects.add(user=request.user, author=author) is None:
+            raise relation_error('Вы уже подписаны на пользователя')
+        author.is_subscribed = True
+        serializer = SubscribeSerializer(
+            author, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def destroy_subscribe(self, request, pk):
-        subscription = Subscribe.objects.filter(
-            user_id=get_object_or_404(User, id=pk),
-            author=request.user.id
-        )
-        if subscription.exists():
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return remove_relation(Subscribe, User, pk, user=request.user,
+                               author=pk)
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    @conditional(lambda request, **kwargs: ['tags'],
+                 public=True, max_age=CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(lambda request, **kwargs: ['tags'],
+                 public=True, max_age=CACHE_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Ингредиенты.
+
+    Отдаются из справочника в памяти процесса, поиск по name:
+    сначала совпадения по началу названия, затем по подстроке.
+    """
+
     queryset = Ingredient.objects.all()
-    filter_backends = [DjangoFilterBackend]
-    filter_class = IngredientFilter
     serializer_class = IngredientSerializer
 
+    @conditional(lambda request, **kwargs: ['ingredients'],
+                 versions_ttl=VERSION_CHECK_TTL, public=True,
+                 max_age=CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_catalogue.search(name))
+        return Response(ingredient_catalogue.all())
+
+    @conditional(lambda request, **kwargs: ['ingredients'],
+                 versions_ttl=VERSION_CHECK_TTL, public=True,
+                 max_age=CACHE_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        ingredient = pk.isdigit() and ingredient_catalogue.get(int(pk))
+        if not ingredient:
+            raise Http404
+        return Response(ingredient)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -108,86 +186,187 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = FoodgramPagination
     permission_classes = [IsAuthorOrReadOnly]
 
+    def get_queryset(self):
+        if self.action == 'feed':
+            return Recipe.objects.select_related('author').with_user_flags(
+                self.request.user).filter(author__in=Subscribe.objects.filter(
+                    user=self.request.user).values('author')
+            ).order_by('-pub_date', '-pk')
+        if self.action == 'cook':
+            return Recipe.objects.select_related('author').with_user_flags(
+                self.request.user)
+        if self.action == 'popular':
+            return Recipe.objects.select_related('author').with_user_flags(
+                self.request.user).order_by('-popularity', '-pk')
+        if self.action in ('list', 'retrieve', 'similar'):
+            return Recipe.objects.select_related('author').with_user_flags(
+                self.request.user)
+        return Recipe.objects.for_user(self.request.user)
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов.
+
+        Общая часть представления берётся из recipe_cache,
+        флаги пользователя подставляются поверх неё.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                recipe_cache.represent(page, context))
+        return Response(recipe_cache.represent(list(queryset), context))
+
+    @action(detail=False, methods=['GET'])
+    def popular(self, request):
+        """
+        Популярные рецепты.
+
+        Сортировка по колонке popularity, которую пересчитывает
+        команда compute_popularity.
+        """
+        return self.list(request)
+
+    @action(detail=False, methods=['GET'])
+    def cook(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются параметром ingredients (id через
+        запятую). Рецепты упорядочены по доле имеющихся ингредиентов,
+        к каждому добавлен список недостающих.
+        """
+        ingredient_ids = {
+            value for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value
+        }
+        if not ingredient_ids or not all(
+                value.isdigit() for value in ingredient_ids):
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов через запятую'})
+        ingredient_ids = set(map(int, ingredient_ids))
+        index = ingredient_recipe_index.get()
+        queryset = cookable_recipes(
+            self.filter_queryset(self.get_queryset()), index, ingredient_ids)
+        page = self.paginate_queryset(queryset)
+        data = recipe_cache.represent(page, self.get_serializer_context())
+        missing = {recipe.pk: index.missing(recipe.pk, ingredient_ids)
+                   for recipe in page}
+        ingredients = ingredient_catalogue.in_bulk(
+            {pk for pks in missing.values() for pk in pks})
+        for recipe, item in zip(page, data):
+            item['coverage'] = recipe.coverage
+            item['matched'] = recipe.matched
+            item['missing_ingredients'] = [
+                ingredients[pk] for pk in missing[recipe.pk]
+                if pk in ingredients
+            ]
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """
+        Лента: новые рецепты авторов из подписок.
+
+        Страницы выбираются по курсору (pub_date, id), запрос
+        идёт по индексу (author, -pub_date).
+        """
+        return self.list(request)
+
+    @conditional(recipe_versions, private=True, no_cache=True)
+    def retrieve(self, request, *args, **kwargs):
+        return Response(recipe_cache.represent(
+            [self.get_object()], self.get_serializer_context())[0])
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        """
+        Похожие рецепты.
+
+        Соседи заранее посчитаны командой compute_similar_recipes,
+        здесь только выборка по индексу (recipe, -score).
+        """
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        recipes = self.get_queryset().filter(
+            similar_to__recipe=recipe).order_by('-similar_to__score')
+        return Response(recipe_cache.represent(
+            list(recipes), self.get_serializer_context()))
+
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
 
-    def delete_favorite(self, request, pk, model):
-        model = model.objects.filter(
-            author=request.user.id,
-            recipe=get_object_or_404(Recipe, id=pk)
-        )
-        if model.exists():
-            model.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    def add_recipe(self, request, pk, model, message):
+        recipe = get_object_or_404(Recipe, id=pk)
+        if model.objects.add(user=request.user, recipe=recipe) is None:
+            raise relation_error(message)
+        serializer = RecipeMiniSerializer(recipe,
+                                          context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['POST'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
-        context = {'request': request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = CreateFavoriteSerializer(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_recipe(request, pk, Favourites,
+                               'Рецепт уже добавлен в избранное')
 
     @favorite.mapping.delete
     def favorite_destroy(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        Favourites.objects.get(user=request.user,
-                               recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return remove_relation(Favourites, Recipe, pk, user=request.user,
+                               recipe=pk)
 
     @action(detail=True, methods=['POST'],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
-        context = {'request': request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = CreateShoppingCartSerializer(data=data,
-                                                  context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_recipe(request, pk, ShoppingCart,
+                               'Рецепт уже добавлен в корзину')
 
     @shopping_cart.mapping.delete
     def destroy_shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        ShoppingCart.objects.filter(
-            user=request.user.id,
-            recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return remove_relation(ShoppingCart, Recipe, pk,
+                               user=request.user, recipe=pk)
 
     @action(detail=False, methods=['GET'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[ShoppingListTextRenderer,
+                              ShoppingListCSVRenderer,
+                              ShoppingListJSONRenderer,
+                              ShoppingListPDFRenderer])
     def download_shopping_cart(self, request):
+        """
+        Список покупок.
+
+        Формат выбирается параметром format (txt, csv, json, pdf),
+        файл отдаётся потоком по мере чтения строк из курсора.
+        """
         user = self.request.user
         if not user.shopping_cart.exists():
             return Response('Ваша корзина пуста',
                             status=status.HTTP_400_BAD_REQUEST)
-        text = 'Список ингредиентов:'
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values('ingredient__name', 'ingredient__measurement_unit'
-                 ).annotate(amount=Sum('amount'))
-        for ingredient in ingredients:
-            text += (
-                f'\n{ingredient["ingredient__name"]}'
-                f' ({ingredient["ingredient__measurement_unit"]})'
-                f' - {ingredient["amount"]}')
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(text, content_type='text/plain')
+        ingredients = user.shopping_list.values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
+        ).order_by('name')
+        if settings.SERVER_MODE == 'asgi':
+            # Django 3.2 читает потоковый ответ в цикле событий,
+            # где запросы к базе запрещены: выбираем строки заранее.
+            ingredients = list(ingredients)
+        else:
+            ingredients = ingredients.iterator()
+        renderer = request.accepted_renderer
+        filename = f'{user.username}_shopping_list.{renderer.format}'
+        content_type = renderer.media_type
+        if renderer.render_style != 'binary':
+            content_type += '; charset=utf-8'
+        response = StreamingHttpResponse(renderer.stream(ingredients),
+                                         content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
@@ -4,3 +4,20 @@ MAIL_LENGTH = 200
 NAME_LENGTH = 50
 MAX_LENGTH_TAG = 64
 PAGE_SIZE = 6
+MIN_CONTAINS_SEARCH_LENGTH = 3
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+CACHE_MAX_AGE = 60 * 10
+TOKEN_CACHE_TTL = 60 * 10
+VERSION_CHECK_TTL = 5
+VERSION_CLOCK_MARGIN = 60
+POPULARITY_HALF_LIFE_DAYS = 7
+POPULARITY_WINDOW_DAYS = 90
+FAVORITE_WEIGHT = 1
+SHOPPING_CART_WEIGHT = 2
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULTS_LIMIT = 1000
+COOK_RESULTS_LIMIT = 1000
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_INGREDIENTS_WEIGHT = 0.5
+SIMILAR_FAVORITES_WEIGHT = 0.5
@@ -0,0 +1,151 @@
+from threading import BoundedSemaphore, Lock
+
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+# Пулы по (alias, база, параметры соединения): тесты подменяют
+# имя базы, и соединения к прежней базе выдаваться не должны.
+pools = {}
+pools_lock = Lock()
+
+
+def close_pools(alias=None, database=None):
+    """Закрывает пулы подключения alias или базы database."""
+    with pools_lock:
+        for key in list(pools):
+            if alias in (None, key[0]) and database in (None, key[1]):
+                pools.pop(key).closeall()
+
+
+class BoundedConnectionPool(ThreadedConnectionPool):
+    """
+    Пул, который ждёт свободное соединение.
+
+    ThreadedConnectionPool сразу бросает PoolError, когда все
+    соединения заняты. Здесь getconn ждёт до timeout секунд,
+    пока другой поток не вернёт соединение.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=None, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self.slots = BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolError(
+                f'Нет свободных соединений за {self.timeout} с')
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        super().putconn(conn, key, close)
+        self.slots.release()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула не дают удалить тестовую базу.
+        close_pools(database=test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений и пулом.
+
+    При CONN_HEALTH_CHECKS постоянное соединение проверяется
+    перед первым запросом в каждом HTTP-запросе, а не после ошибки,
+    как в стандартном бэкенде. Если задан POOL_SIZE, соединения
+    берутся из общего для потоков процесса пула и возвращаются
+    в него в конце запроса вместо закрытия. Если свободных
+    соединений нет, поток ждёт до POOL_TIMEOUT секунд.
+    """
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    def get_pool(self, conn_params):
+        if not self.settings_dict.get('POOL_SIZE'):
+            return None
+        key = (self.alias, conn_params.get('database'),
+               repr(sorted(conn_params.items())))
+        with pools_lock:
+            if key not in pools:
+                pools[key] = BoundedConnectionPool(
+                    self.settings_dict.get('POOL_MIN_SIZE', 1),
+                    self.settings_dict.get('POOL_SIZE'),
+                    timeout=self.settings_dict.get('POOL_TIMEOUT'),
+                    **conn_params
+                )
+            return pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn()
+        self.pool = pool
+        if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.is_raw_usable(connection)):
+            pool.putconn(connection, close=True)
+            connection = pool.getconn()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection,
+                                               loads=lambda x: x)
+        return connection
+
+    def is_raw_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool, self.pool = self.pool, None
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection, close=bool(self.connection.closed))
+
+    def connect(self):
+        # set_autocommit() внутри connect() вызывает ensure_connection():
+        # проверка там открыла бы транзакцию на свежем соединении.
+        self.health_check_done = True
+        try:
+            super().connect()
+        except Exception:
+            self.health_check_done = False
+            raise
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None and self.settings_dict.get('POOL_SIZE'):
+            if not self.in_atomic_block:
+                self.close()
+            return
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -2,18 +2,20 @@ from django.contrib import admin
 from django.contrib.admin import display
 
 from .models import (Favourites, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Subscribe, Tag)
+                     ShoppingCart, ShoppingListItem, Subscribe, Tag)
 
 
 @admin.register(Recipe)
 class AdminRecipe(admin.ModelAdmin):
-    list_display = ('name', 'id', 'author', 'added_to_favorites',)
-    readonly_fields = ('added_to_favorites',)
+    list_display = ('name', 'id', 'author', 'added_to_favorites',
+                    'cart_count')
+    readonly_fields = ('added_to_favorites', 'cart_count', 'popularity')
+    exclude = ('favorites_count',)
     list_filter = ('author', 'name', 'tags')
 
-    @display(description='В избранном')
+    @display(description='В избранном', ordering='favorites_count')
     def added_to_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
@@ -42,6 +44,11 @@ class AdminShoppingCart(admin.ModelAdmin):
     list_display = ('user', 'recipe')
 
 
+@admin.register(ShoppingListItem)
+class AdminShoppingListItem(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+
+
 @admin.register(Subscribe)
 class AdminSubscribe(admin.ModelAdmin):
     list_display = ('user', 'author')
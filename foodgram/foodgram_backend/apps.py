@@ -5,3 +5,6 @@ class FoodgramBackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram_backend'
     verbose_name = 'Бекэнд'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,62 @@
+from itertools import count
+from math import ceil
+from threading import Thread
+from time import perf_counter
+
+from django.db import connections
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(ceil(len(values) * percent / 100) - 1, 0)]
+
+
+def run_load(call, arguments, concurrency, requests):
+    """
+    Нагрузка из concurrency потоков.
+
+    Потоки по очереди вызывают call с аргументами из arguments,
+    всего requests раз. Возвращает задержки вызовов в секундах
+    и общее время. Соединения с базой у каждого потока свои
+    и закрываются, когда поток заканчивает работу.
+    """
+    arguments = list(arguments)
+    indexes = count()
+    latencies, errors = [], []
+
+    def worker():
+        try:
+            for index in indexes:
+                if index >= requests:
+                    return
+                started = perf_counter()
+                call(arguments[index % len(arguments)])
+                latencies.append(perf_counter() - started)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections.close_all()
+
+    threads = [Thread(target=worker) for _ in range(concurrency)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return latencies, perf_counter() - started
+
+
+def summary(latencies, elapsed):
+    """Строка отчёта: пропускная способность и перцентили задержки."""
+    milliseconds = [latency * 1000 for latency in latencies]
+    return (
+        f'запросов: {len(latencies)}, '
+        f'{len(latencies) / elapsed:.0f} в секунду, '
+        f'p50 {percentile(milliseconds, 50):.1f} мс, '
+        f'p95 {percentile(milliseconds, 95):.1f} мс, '
+        f'p99 {percentile(milliseconds, 99):.1f} мс, '
+        f'максимум {max(milliseconds):.1f} мс'
+    )
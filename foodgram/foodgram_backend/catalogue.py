@@ -0,0 +1,84 @@
+from bisect import bisect_left
+from threading import Lock
+
+from foodgram.constants import MIN_CONTAINS_SEARCH_LENGTH, VERSION_CHECK_TTL
+
+from .models import Ingredient
+from .versions import data_versions
+
+
+class IngredientCatalogue:
+    """
+    Справочник ингредиентов в памяти процесса.
+
+    Загружается один раз на воркер и хранит ингредиенты
+    отсортированными по имени, поиск по префиксу идёт бисекцией.
+    Версия справочника лежит в таблице DataVersion: её смена любым
+    процессом заставляет остальные перечитать таблицу. Версия
+    сверяется не чаще раза в VERSION_CHECK_TTL секунд, в остальное
+    время подсказки к базе не обращаются.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.items, self.by_id, self.index = [], {}, ([], [])
+
+    def get_version(self):
+        return data_versions.get('ingredients', VERSION_CHECK_TTL)[0]
+
+    def invalidate(self):
+        data_versions.bump(['ingredients'])
+        self.version = None
+
+    def load(self):
+        version = self.get_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            items = list(Ingredient.objects.order_by('id').values(
+                'id', 'name', 'measurement_unit'))
+            sorted_items = sorted(items,
+                                  key=lambda item: item['name'].lower())
+            names = [item['name'].lower() for item in sorted_items]
+            self.items, self.by_id, self.index = (
+                items,
+                {item['id']: item for item in items},
+                (names, sorted_items)
+            )
+            self.version = version
+
+    def all(self):
+        self.load()
+        return self.items
+
+    def get(self, pk):
+        self.load()
+        return self.by_id.get(pk)
+
+    def in_bulk(self, pks):
+        """Словарь id → ингредиент для найденных в справочнике id."""
+        self.load()
+        by_id = self.by_id
+        return {pk: by_id[pk] for pk in pks if pk in by_id}
+
+    def search(self, query):
+        """Сначала совпадения по префиксу, затем по вхождению."""
+        self.load()
+        query = query.lower()
+        names, items = self.index
+        start = end = bisect_left(names, query)
+        while end < len(names) and names[end].startswith(query):
+            end += 1
+        result = items[start:end]
+        if len(query) < MIN_CONTAINS_SEARCH_LENGTH:
+            return result
+        return result + [
+            item for name, item in zip(names, items)
+            if query in name and not name.startswith(query)
+        ]
+
+
+ingredient_catalogue = IngredientCatalogue()
@@ -0,0 +1,158 @@
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from foodgram.constants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS
+
+logger = logging.getLogger(__name__)
+
+
+def variant_name(name, width, image_format):
+    """Имя уменьшенной копии изображения в хранилище."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}_{width}.{image_format}'
+
+
+def manifest_name(name):
+    """Список готовых ширин; появляется последним, когда копии готовы."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}.json'
+
+
+def variant_widths(width):
+    """Ширины копий для оригинала шириной width: без увеличения."""
+    return sorted({min(variant, width) for variant in IMAGE_VARIANT_WIDTHS})
+
+
+def variant_names(name, widths=IMAGE_VARIANT_WIDTHS):
+    return [(width, image_format, variant_name(name, width, image_format))
+            for image_format in IMAGE_VARIANT_FORMATS
+            for width in widths]
+
+
+def rendered_widths(name):
+    """Ширины готовых копий или None, если копий ещё нет."""
+    try:
+        with default_storage.open(manifest_name(name)) as manifest:
+            return json.load(manifest)['widths']
+    except FileNotFoundError:
+        return None
+
+
+def delete_image(name):
+    """Удаляет изображение вместе с его копиями."""
+    for _, _, variant in variant_names(
+            name, rendered_widths(name) or IMAGE_VARIANT_WIDTHS):
+        default_storage.delete(variant)
+    default_storage.delete(manifest_name(name))
+    default_storage.delete(name)
+
+
+def replace_file(path, write):
+    """Запись через временный файл, чтобы nginx не отдал недописанный."""
+    temporary = f'{path}.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def render_variants(path):
+    """
+    Перекодирование изображения.
+
+    Выполняется в отдельном процессе: сохраняет рядом с оригиналом
+    копии ширин из variant_widths, последней — список этих ширин.
+    Оригинал уже самой узкой копии сохраняется в своей ширине.
+    """
+    with Image.open(path) as original:
+        image = original.convert('RGB')
+    widths = variant_widths(image.width)
+    os.makedirs(os.path.dirname(manifest_name(path)), exist_ok=True)
+    for width in widths:
+        variant = image
+        if image.width > width:
+            variant = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.LANCZOS
+            )
+        for image_format in IMAGE_VARIANT_FORMATS:
+            replace_file(
+                variant_name(path, width, image_format),
+                lambda output: variant.save(
+                    output, format=image_format.upper(), quality=80))
+
+    def write_manifest(output):
+        with open(output, 'w') as manifest:
+            json.dump({'widths': widths}, manifest)
+    replace_file(manifest_name(path), write_manifest)
+    return widths
+
+
+class ImagePipeline:
+    """
+    Фоновая обработка изображений рецептов.
+
+    Задачи ставятся в очередь пула процессов, запрос не ждёт
+    перекодирования. Пул создаётся при первой задаче.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.executor = None
+        self.pending = set()
+        self.failed = set()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self.executor
+
+    def schedule(self, name):
+        self.pending.add(name)
+        future = self.get_executor().submit(
+            render_variants, default_storage.path(name))
+        future.add_done_callback(
+            lambda future: self.finish(name, future))
+        return future
+
+    def finish(self, name, future):
+        self.pending.discard(name)
+        if future.exception() is not None:
+            self.failed.add(name)
+            logger.error('Не удалось обработать изображение %s', name,
+                         exc_info=future.exception())
+        else:
+            # Модуль импортируется и в процессах пула, где приложения
+            # Django не загружены, поэтому модели подключаем здесь.
+            from .versions import data_versions
+            data_versions.bump(['recipe_images'])
+
+    def ready_variants(self, name):
+        """
+        Готовые копии изображения.
+
+        Если копий ещё нет (например, у изображений, загруженных
+        до появления обработки), ставит их создание в очередь
+        и возвращает пустой список.
+        """
+        widths = rendered_widths(name)
+        if widths is not None:
+            return variant_names(name, widths)
+        if name not in self.pending and name not in self.failed:
+            self.schedule(name)
+        return []
+
+
+image_pipeline = ImagePipeline()
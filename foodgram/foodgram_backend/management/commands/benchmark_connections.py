@@ -0,0 +1,52 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from foodgram_backend.benchmark import run_load, summary
+
+from foodgram.postgresql.base import close_pools
+
+MODES = {
+    'new': {'CONN_MAX_AGE': 0, 'POOL_SIZE': 0},
+    'persistent': {'CONN_MAX_AGE': None, 'POOL_SIZE': 0},
+    'pooled': {'CONN_MAX_AGE': 0},
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает накладные расходы соединений с базой: новое '
+            'соединение на запрос, постоянные соединения и пул.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Число параллельных потоков.')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Число запросов в каждом режиме.')
+        parser.add_argument(
+            '--pool-size', type=int, default=8,
+            help='Размер пула. Если он меньше числа потоков, '
+                 'потоки ждут свободное соединение.'
+        )
+
+    def handle(self, *args, **options):
+        database = connections.databases[DEFAULT_DB_ALIAS]
+        if database['ENGINE'] != 'foodgram.postgresql':
+            raise CommandError('Нужна база PostgreSQL (foodgram.postgresql).')
+        for mode, overrides in MODES.items():
+            alias = f'benchmark_{mode}'
+            connections.databases[alias] = {
+                **database, 'POOL_SIZE': options['pool_size'], **overrides}
+
+            def request(_, alias=alias):
+                # Как обработка HTTP-запроса: запрос к базе, затем
+                # закрытие соединения по сигналу request_finished.
+                connection = connections[alias]
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                connection.close_if_unusable_or_obsolete()
+
+            try:
+                latencies, elapsed = run_load(request, [None],
+                                              options['concurrency'],
+                                              options['requests'])
+            finally:
+                close_pools(alias=alias)
+            self.stdout.write(f'{mode}: {summary(latencies, elapsed)}')
@@ -0,0 +1,103 @@
+from random import sample
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from foodgram_backend.benchmark import summary
+from foodgram_backend.models import Recipe, Subscribe
+from rest_framework.test import APIClient
+from users.models import User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Замеряет ленту /api/recipes/feed/ для пользователя, '
+            'подписанного на тысячи авторов. Данные создаются '
+            'в транзакции и после замера откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=5000,
+                            help='Число авторов в подписках.')
+        parser.add_argument('--others', type=int, default=5000,
+                            help='Число авторов вне подписок.')
+        parser.add_argument('--recipes', type=int, default=5,
+                            help='Число рецептов у каждого автора.')
+        parser.add_argument('--pages', type=int, default=50,
+                            help='Сколько страниц ленты пролистать.')
+        parser.add_argument('--limit', type=int, default=6,
+                            help='Размер страницы.')
+        parser.add_argument('--explain', action='store_true',
+                            help='Показать планы запросов первой '
+                                 'и последней страниц.')
+
+    def create_data(self, options):
+        prefix = uuid4().hex[:8]
+        users = User.objects.bulk_create(
+            (User(username=f'feed_{prefix}_{index}',
+                  email=f'feed_{prefix}_{index}@example.com',
+                  first_name='Автор', last_name=str(index))
+             for index in range(options['authors'] + options['others'] + 1)),
+            batch_size=BATCH_SIZE)
+        follower, authors = users[0], users[1:]
+        Subscribe.objects.bulk_create(
+            (Subscribe(user=follower, author=author)
+             for author in sample(authors, options['authors'])),
+            batch_size=BATCH_SIZE)
+        # Рецепты разных авторов перемешаны по времени публикации.
+        Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Рецепт {number}', text='Текст',
+                    cooking_time=10)
+             for number in range(options['recipes'])
+             for author in authors),
+            batch_size=BATCH_SIZE)
+        # Статистика по новым строкам, иначе планировщик считает
+        # таблицы почти пустыми и план не похож на рабочий.
+        with connection.cursor() as cursor:
+            for model in (User, Subscribe, Recipe):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        return follower
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = perf_counter()
+            follower = self.create_data(options)
+            self.stdout.write(f'Данные созданы за '
+                              f'{perf_counter() - started:.1f} с')
+            client = APIClient()
+            client.force_authenticate(follower)
+            url = f'/api/recipes/feed/?limit={options["limit"]}'
+            latencies, queries, contexts = [], [], []
+            while url and len(latencies) < options['pages']:
+                with CaptureQueriesContext(connection) as context:
+                    started = perf_counter()
+                    response = client.get(url)
+                    latencies.append(perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'Ответ {response.status_code}')
+                queries.append(len(context))
+                contexts = contexts[:1] + [context]
+                url = response.data['next']
+            if options['explain']:
+                # Последняя страница — по курсору, далеко от начала ленты.
+                for title, context in zip(('Первая', 'Последняя'),
+                                          contexts):
+                    self.stdout.write(f'{title} страница:')
+                    self.explain(context)
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'Подписок: {options["authors"]}, '
+            f'страниц: {len(latencies)} по {options["limit"]}')
+        self.stdout.write(summary(latencies, sum(latencies)))
+        self.stdout.write(f'Запросов на страницу: от {min(queries)} '
+                          f'до {max(queries)}')
+
+    def explain(self, context):
+        # Запрос страницы — первый, где рецепты выбираются по подпискам.
+        sql = next(query['sql'] for query in context.captured_queries
+                   if 'foodgram_backend_subscribe' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN ANALYZE {sql}')
+            self.stdout.write('\n'.join(row[0] for row in cursor.fetchall()))
@@ -0,0 +1,62 @@
+from threading import local
+
+import requests
+from django.core.management import BaseCommand, CommandError
+from django.test import Client
+from foodgram_backend.benchmark import run_load, summary
+from foodgram_backend.models import Ingredient
+
+PREFIX_LENGTHS = (1, 2, 3)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку подсказок по ингредиентам '
+            '(/api/ingredients/?name=) под параллельной нагрузкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Число параллельных клиентов.')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Общее число запросов.')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://localhost:8000.'
+                 ' Без него запросы идут через тестовый клиент Django'
+                 ' в этом процессе.'
+        )
+
+    def handle(self, *args, **options):
+        prefixes = sorted({
+            name[:length].lower()
+            for name in Ingredient.objects.values_list('name', flat=True)
+            for length in PREFIX_LENGTHS if len(name) >= length
+        })
+        if not prefixes:
+            raise CommandError('Нет ингредиентов: загрузите их csv_import.')
+        clients = local()
+
+        def search_in_process(prefix):
+            if not hasattr(clients, 'client'):
+                clients.client = Client()
+            response = clients.client.get('/api/ingredients/',
+                                          {'name': prefix})
+            if response.status_code != 200:
+                raise CommandError(f'Ответ {response.status_code}')
+
+        def search_over_http(prefix):
+            if not hasattr(clients, 'session'):
+                clients.session = requests.Session()
+            clients.session.get(
+                f'{options["url"].rstrip("/")}/api/ingredients/',
+                params={'name': prefix}, timeout=10
+            ).raise_for_status()
+
+        search = search_over_http if options['url'] else search_in_process
+        search(prefixes[0])
+        latencies, elapsed = run_load(search, prefixes,
+                                      options['concurrency'],
+                                      options['requests'])
+        self.stdout.write(
+            f'Префиксов: {len(prefixes)}, '
+            f'клиентов: {options["concurrency"]}')
+        self.stdout.write(summary(latencies, elapsed))
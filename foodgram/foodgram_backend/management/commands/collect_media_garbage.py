@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.utils import timezone
+from foodgram_backend.images import (manifest_name, rendered_widths,
+                                     variant_names)
+from foodgram_backend.models import Recipe
+
+from foodgram.constants import IMAGE_VARIANT_WIDTHS
+
+IMAGES_DIRECTORY = 'foodgram_backend'
+
+
+class Command(BaseCommand):
+    help = 'Удаляет изображения, на которые не ссылается ни один рецепт.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены.'
+        )
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Не трогать файлы моложе указанного числа минут.'
+        )
+
+    def handle(self, *args, **options):
+        referenced = set(Recipe.objects.values_list('image', flat=True))
+        keep = referenced | {manifest_name(name) for name in referenced} | {
+            variant for name in referenced
+            for _, _, variant in variant_names(
+                name, rendered_widths(name) or IMAGE_VARIANT_WIDTHS)
+        }
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+        garbage = []
+        for directory in (IMAGES_DIRECTORY, f'{IMAGES_DIRECTORY}/variants'):
+            if not default_storage.exists(directory):
+                continue
+            _, files = default_storage.listdir(directory)
+            garbage += [
+                name for name in (f'{directory}/{file}' for file in files)
+                if name not in keep
+                and default_storage.get_modified_time(name) < threshold
+            ]
+        for name in garbage:
+            self.stdout.write(name)
+            if not options['dry_run']:
+                default_storage.delete(name)
+        self.stdout.write(f'Неиспользуемых файлов: {len(garbage)}')
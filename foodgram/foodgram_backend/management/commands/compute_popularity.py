@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+from foodgram_backend.models import Favourites, Recipe, ShoppingCart
+
+from foodgram.constants import (FAVORITE_WEIGHT, POPULARITY_HALF_LIFE_DAYS,
+                                POPULARITY_WINDOW_DAYS, SHOPPING_CART_WEIGHT)
+
+ACTIVITY = ((Favourites, FAVORITE_WEIGHT),
+            (ShoppingCart, SHOPPING_CART_WEIGHT))
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов по добавлениям '
+            'в избранное и корзину с затуханием по времени.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        scores = {}
+        for model, weight in ACTIVITY:
+            activity = model.objects.filter(
+                created__gte=now - timedelta(days=POPULARITY_WINDOW_DAYS)
+            ).values('recipe', day=TruncDay('created')).annotate(
+                count=Count('pk')
+            ).order_by()
+            for row in activity.iterator():
+                age = (now - row['day']).total_seconds() / 86400
+                scores[row['recipe']] = scores.get(row['recipe'], 0) + (
+                    weight * row['count']
+                    * 0.5 ** (age / POPULARITY_HALF_LIFE_DAYS))
+        with transaction.atomic():
+            Recipe.objects.filter(popularity__gt=0).update(popularity=0)
+            Recipe.objects.bulk_update(
+                [Recipe(pk=pk, popularity=score)
+                 for pk, score in scores.items()],
+                ['popularity'], batch_size=500)
+        self.stdout.write(f'Пересчитана популярность рецептов: {len(scores)}')
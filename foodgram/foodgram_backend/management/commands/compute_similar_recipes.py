@@ -0,0 +1,74 @@
+import numpy as np
+from django.core.management import BaseCommand
+from django.db import transaction
+from foodgram_backend.models import (Favourites, IngredientInRecipe, Recipe,
+                                     SimilarRecipe)
+from scipy import sparse
+
+from foodgram.constants import (SIMILAR_FAVORITES_WEIGHT,
+                                SIMILAR_INGREDIENTS_WEIGHT,
+                                SIMILAR_RECIPES_LIMIT)
+
+CHUNK_SIZE = 200
+
+
+def normalized_rows(recipe_ids, pairs):
+    """
+    Разреженная матрица «рецепт × признак» с единичными строками.
+
+    Произведение таких матриц на транспонированные даёт
+    косинусное сходство рецептов.
+    """
+    pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    _, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows, columns.ravel())),
+        shape=(len(recipe_ids), columns.max(initial=-1) + 1))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты по общим ингредиентам '
+            'и совместному добавлению в избранное.')
+
+    def handle(self, *args, **options):
+        recipe_ids = np.array(sorted(
+            Recipe.objects.values_list('pk', flat=True)), dtype=np.int64)
+        ingredients = normalized_rows(
+            recipe_ids, IngredientInRecipe.objects.values_list(
+                'recipe', 'ingredient').iterator())
+        favorites = normalized_rows(
+            recipe_ids, Favourites.objects.values_list(
+                'recipe', 'user').iterator())
+        similar = []
+        for start in range(0, len(recipe_ids), CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, len(recipe_ids))
+            scores = (
+                SIMILAR_INGREDIENTS_WEIGHT
+                * (ingredients[start:stop] @ ingredients.T)
+                + SIMILAR_FAVORITES_WEIGHT
+                * (favorites[start:stop] @ favorites.T)
+            ).tocsr()
+            for row in range(stop - start):
+                begin, end = scores.indptr[row], scores.indptr[row + 1]
+                columns = scores.indices[begin:end]
+                values = scores.data[begin:end]
+                keep = (columns != start + row) & (values > 0)
+                columns, values = columns[keep], values[keep]
+                if len(values) > SIMILAR_RECIPES_LIMIT:
+                    top = np.argpartition(
+                        -values, SIMILAR_RECIPES_LIMIT)[:SIMILAR_RECIPES_LIMIT]
+                    columns, values = columns[top], values[top]
+                similar.extend(
+                    SimilarRecipe(recipe_id=int(recipe_ids[start + row]),
+                                  similar_id=pk, score=value)
+                    for pk, value in zip(recipe_ids[columns].tolist(),
+                                         values.tolist())
+                )
+        with transaction.atomic():
+            SimilarRecipe.objects.all().delete()
+            SimilarRecipe.objects.bulk_create(similar, batch_size=1000)
+        self.stdout.write(f'Сохранено похожих рецептов: {len(similar)}')
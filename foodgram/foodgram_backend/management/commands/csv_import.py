@@ -2,6 +2,7 @@ from csv import DictReader
 
 from django.core.management import BaseCommand
 
+from foodgram_backend.catalogue import ingredient_catalogue
 from foodgram_backend.models import Ingredient
 
 models = {
@@ -17,3 +18,4 @@ class Command(BaseCommand):
                 rows = DictReader(file)
                 records = [model(**row) for row in rows]
                 model.objects.bulk_create(records)
+        ingredient_catalogue.invalidate()
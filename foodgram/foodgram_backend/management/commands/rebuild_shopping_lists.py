@@ -0,0 +1,48 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Sum
+from foodgram_backend.models import (IngredientInRecipe, ShoppingCart,
+                                     ShoppingListItem)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает списки покупок по корзинам пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить списки покупок с корзинами.'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_lists()
+        user_ids = set(ShoppingCart.objects.values_list('user', flat=True))
+        user_ids |= set(ShoppingListItem.objects.values_list('user',
+                                                             flat=True))
+        ShoppingListItem.objects.refresh(user_ids)
+        self.stdout.write(f'Пересчитано списков покупок: {len(user_ids)}')
+
+    def check_lists(self):
+        expected = {
+            (row['recipe__shopping_cart__user'], row['ingredient']):
+            row['total']
+            for row in IngredientInRecipe.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values('recipe__shopping_cart__user', 'ingredient').annotate(
+                total=Sum('amount')
+            ).order_by()
+        }
+        actual = {
+            (row['user'], row['ingredient']): row['amount']
+            for row in ShoppingListItem.objects.values(
+                'user', 'ingredient', 'amount')
+        }
+        broken = {user for user, ingredient in expected.keys() | actual.keys()
+                  if expected.get((user, ingredient))
+                  != actual.get((user, ingredient))}
+        if broken:
+            raise CommandError(
+                'Списки покупок расходятся с корзинами у пользователей: '
+                + ', '.join(map(str, sorted(broken)))
+            )
+        self.stdout.write('Списки покупок совпадают с корзинами')
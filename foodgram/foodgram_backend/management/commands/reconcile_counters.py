@@ -0,0 +1,50 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from foodgram_backend.models import Favourites, Recipe, ShoppingCart, Subscribe
+from users.models import User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favourites, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def count_of(model, field):
+    """Подзапрос: число строк model, ссылающихся на запись по field."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики рецептов и пользователей с таблицами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить счётчики, не исправляя их.'
+        )
+
+    def handle(self, *args, **options):
+        drift = {}
+        for model, counter, source, field in COUNTERS:
+            pks = list(model.objects.annotate(
+                actual=count_of(source, field)
+            ).exclude(**{counter: F('actual')}).values_list('pk', flat=True))
+            if pks and not options['check']:
+                model.objects.filter(pk__in=pks).update(
+                    **{counter: count_of(source, field)})
+            if pks:
+                drift[f'{model._meta.model_name}.{counter}'] = len(pks)
+        report = ', '.join(f'{name}: {count}'
+                           for name, count in drift.items())
+        if options['check'] and drift:
+            raise CommandError(f'Счётчики расходятся с таблицами: {report}')
+        if drift:
+            self.stdout.write(f'Исправлены счётчики: {report}')
+        else:
+            self.stdout.write('Счётчики совпадают с таблицами')
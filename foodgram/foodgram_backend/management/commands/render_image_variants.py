@@ -0,0 +1,29 @@
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from foodgram_backend.images import render_variants, rendered_widths
+from foodgram_backend.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие копии.'
+        )
+
+    def handle(self, *args, **options):
+        names = set(Recipe.objects.exclude(image='').values_list('image',
+                                                                 flat=True))
+        rendered = 0
+        for name in sorted(names):
+            if not options['force'] and rendered_widths(name) is not None:
+                continue
+            try:
+                render_variants(default_storage.path(name))
+            except OSError as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            rendered += 1
+        self.stdout.write(f'Обработано изображений: {rendered}')
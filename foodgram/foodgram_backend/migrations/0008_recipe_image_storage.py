@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:47
+
+from django.db import migrations, models
+import foodgram_backend.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0007_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=foodgram_backend.storage.ContentAddressedStorage(), upload_to='foodgram_backend/', verbose_name='Фото'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Exists, F, OuterRef
+
+
+def swap_user_and_author(apps, schema_editor):
+    """
+    Меняет местами подписчика и автора в старых подписках.
+
+    Прежний эндпоинт subscribe записывал автора в user, а подписчика
+    в author. Взаимные подписки при обмене не меняются, их
+    пропускаем, чтобы не нарушить уникальность (user, author).
+    """
+    Subscribe = apps.get_model('foodgram_backend', 'Subscribe')
+    Subscribe.objects.exclude(Exists(Subscribe.objects.filter(
+        user=OuterRef('author'), author=OuterRef('user')
+    ))).update(user=F('author'), author=F('user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0008_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(swap_user_and_author, swap_user_and_author),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:59
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+POSTGRESQL_STATEMENTS = (
+    'UPDATE foodgram_backend_recipe SET search_vector = '
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')",
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON foodgram_backend_recipe USING gin (search_vector)',
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in POSTGRESQL_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0012_recipe_author_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Удаляет повторные строки избранного и корзины.
+
+    Остаётся самая ранняя строка пары (user, recipe). Сигналы
+    для исторических моделей не срабатывают, поэтому счётчики
+    рецептов и списки покупок затронутых пользователей
+    пересчитываются здесь же.
+    """
+    Recipe = apps.get_model('foodgram_backend', 'Recipe')
+    IngredientInRecipe = apps.get_model('foodgram_backend',
+                                        'IngredientInRecipe')
+    ShoppingListItem = apps.get_model('foodgram_backend', 'ShoppingListItem')
+    for name, counter in (('Favourites', 'favorites_count'),
+                          ('ShoppingCart', 'cart_count')):
+        model = apps.get_model('foodgram_backend', name)
+        duplicates = list(model.objects.values('user', 'recipe').annotate(
+            count=models.Count('pk')
+        ).filter(count__gt=1).order_by())
+        if not duplicates:
+            continue
+        model.objects.exclude(pk__in=model.objects.values(
+            'user', 'recipe').annotate(first=models.Min('pk')).values('first').order_by()
+        ).delete()
+        Recipe.objects.filter(
+            pk__in={row['recipe'] for row in duplicates}
+        ).update(**{counter: Coalesce(models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk')).order_by()
+            .values('recipe').annotate(count=models.Count('pk'))
+            .values('count')
+        ), 0)})
+        if name != 'ShoppingCart':
+            continue
+        user_ids = {row['user'] for row in duplicates}
+        ShoppingListItem.objects.filter(user__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=row['recipe__shopping_cart__user'],
+                             ingredient_id=row['ingredient'],
+                             amount=row['total'])
+            for row in IngredientInRecipe.objects.filter(
+                recipe__shopping_cart__user__in=user_ids
+            ).values('recipe__shopping_cart__user', 'ingredient').annotate(
+                total=models.Sum('amount')
+            ).order_by()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0014_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:53
+
+from django.db import migrations, models
+import foodgram_backend.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0017_dataversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=foodgram_backend.storage.ContentAddressedStorage(), upload_to='foodgram_backend/', verbose_name='Фото'),
+        ),
+    ]
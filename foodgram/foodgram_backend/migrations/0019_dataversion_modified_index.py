@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_backend', '0018_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dataversion',
+            name='modified',
+            field=models.DateTimeField(db_index=True, verbose_name='Изменено'),
+        ),
+    ]
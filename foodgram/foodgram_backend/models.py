@@ -1,9 +1,38 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.signals import post_delete, post_save
 
 from foodgram.constants import MAX_LENGTH_TAG, MAX_VALUE_AND_LENGTH
-from users.models import User
+from users.models import CountersMixin, User
+
+from .storage import ContentAddressedStorage
+
+
+class DataVersion(models.Model):
+    """
+    Модель Версия данных.
+
+    Счётчик изменений набора данных (тегов, ингредиентов, рецепта)
+    для ключей кешей и ETag, общий для всех процессов.
+    """
+
+    name = models.CharField(max_length=MAX_VALUE_AND_LENGTH,
+                            primary_key=True,
+                            verbose_name='Данные')
+    version = models.PositiveBigIntegerField(default=0,
+                                             verbose_name='Версия')
+    modified = models.DateTimeField(db_index=True,
+                                    verbose_name='Изменено')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.version}'
 
 
 class Tag(models.Model):
@@ -47,7 +76,57 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов."""
+
+    @staticmethod
+    def related_lookups():
+        """Префетчи ингредиентов и тегов рецепта."""
+        return (
+            Prefetch('ingredient_in_recipe',
+                     queryset=IngredientInRecipe.objects
+                     .select_related('ingredient')),
+            'tags',
+        )
+
+    def with_user_flags(self, user):
+        """Флаги is_favorited и is_in_shopping_cart подзапросами Exists."""
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favourites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def for_user(self, user):
+        """
+        Рецепты для выдачи пользователю.
+
+        Флаги is_favorited, is_in_shopping_cart и is_subscribed
+        считаются подзапросами Exists, связанные данные
+        подгружаются префетчами: число запросов не зависит
+        от количества рецептов.
+        """
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscribe.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch('author', queryset=authors), *self.related_lookups()
+        )
+
+    def latest_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора."""
+        return self.filter(pk__in=Subquery(
+            Recipe.objects.filter(author=OuterRef('author'))
+            .order_by('-pub_date', '-pk').values('pk')[:limit]
+        ))
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель Рецепт."""
 
     name = models.CharField(max_length=MAX_VALUE_AND_LENGTH,
@@ -66,6 +145,8 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
     image = models.ImageField(upload_to='foodgram_backend/',
+                              storage=ContentAddressedStorage(),
+                              db_index=True,
                               verbose_name='Фото')
     tags = models.ManyToManyField(Tag,
                                   related_name='recipes',
@@ -74,9 +155,28 @@ class Recipe(models.Model):
         MinValueValidator(1, message='Слишком быстро!'
                           '(минимальное значение = 1)')],
         verbose_name='Время приготовления')
+    favorites_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='В избранном')
+    cart_count = models.PositiveIntegerField(default=0,
+                                             verbose_name='В корзинах')
+    popularity = models.FloatField(default=0,
+                                   verbose_name='Популярность')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'cart_count', 'popularity')
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(fields=('-popularity', '-id'),
+                         name='recipe_popularity_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=('pub_date', 'id'),
+                         name='recipe_pub_date_id_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -114,6 +214,134 @@ class IngredientInRecipe(models.Model):
         return f'{self.ingredient} in {self.recipe}'
 
 
+class SimilarRecipe(models.Model):
+    """
+    Модель Похожий рецепт.
+
+    Соседи рецепта по ингредиентам и совместному добавлению
+    в избранное, считаются командой compute_similar_recipes.
+    """
+
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='similar_recipes',
+                               verbose_name='Рецепт')
+    similar = models.ForeignKey(Recipe,
+                                on_delete=models.CASCADE,
+                                related_name='similar_to',
+                                verbose_name='Похожий рецепт')
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=('recipe', 'similar'),
+            name='unique_recipe_and_similar'
+        ),)
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='similar_recipe_score_idx'),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self) -> str:
+        return f'{self.similar} похож на {self.recipe}'
+
+
+def supports_returning(using):
+    """Поддерживает ли база ON CONFLICT и RETURNING."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+class RelationQuerySet(models.QuerySet):
+    """
+    Кверисет связей пользователя: избранного, корзины и подписок.
+
+    Связь добавляется и удаляется одним запросом
+    INSERT ... ON CONFLICT DO NOTHING или DELETE ... RETURNING,
+    поэтому повторные и параллельные запросы не создают дублей
+    и не падают. Сигналы post_save и post_delete отправляются,
+    только если строка действительно добавлена или удалена.
+    """
+
+    def add(self, **fields):
+        """Добавляет связь, возвращает её или None, если она уже есть."""
+        if not supports_returning(self.db):
+            with transaction.atomic(using=self.db):
+                instance, created = self.get_or_create(**fields)
+            return instance if created else None
+        connection = connections[self.db]
+        opts = self.model._meta
+        instance = self.model(**fields)
+        columns = [field for field in opts.concrete_fields
+                   if not field.primary_key]
+        params = [field.get_db_prep_save(field.pre_save(instance, True),
+                                         connection)
+                  for field in columns]
+        quote = connection.ops.quote_name
+        sql = (
+            f'INSERT INTO {quote(opts.db_table)} '
+            f'({", ".join(quote(field.column) for field in columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}'
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+            if row is None:
+                return None
+            instance.pk = row[0]
+            instance._state.adding = False
+            instance._state.db = self.db
+            post_save.send(sender=self.model, instance=instance,
+                           created=True, update_fields=None, raw=False,
+                           using=self.db)
+        return instance
+
+    def remove(self, **fields):
+        """Удаляет связь, возвращает её или None, если её не было."""
+        if not supports_returning(self.db):
+            with transaction.atomic(using=self.db):
+                instance = self.filter(**fields).first()
+                if instance is not None:
+                    instance.delete()
+            return instance
+        connection = connections[self.db]
+        opts = self.model._meta
+        where = [opts.get_field(name) for name in fields]
+        params = [
+            field.get_db_prep_value(
+                value.pk if isinstance(value, models.Model) else value,
+                connection)
+            for field, value in zip(where, fields.values())
+        ]
+        quote = connection.ops.quote_name
+        sql = (
+            f'DELETE FROM {quote(opts.db_table)} WHERE '
+            + ' AND '.join(f'{quote(field.column)} = %s' for field in where)
+            + ' RETURNING '
+            + ', '.join(quote(field.column) for field in opts.concrete_fields)
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            instances = [
+                self.model.from_db(
+                    self.db,
+                    [field.attname for field in opts.concrete_fields], row)
+                for row in rows
+            ]
+            for instance in instances:
+                post_delete.send(sender=self.model, instance=instance,
+                                 using=self.db)
+        return instances[0] if instances else None
+
+
 class FavoriteShoppingCartModel(models.Model):
     """Базовая модель для Корзины покупок и Избранного."""
     user = models.ForeignKey(User,
@@ -122,9 +350,18 @@ class FavoriteShoppingCartModel(models.Model):
     recipe = models.ForeignKey(Recipe,
                                on_delete=models.CASCADE,
                                verbose_name='Рецепт')
+    created = models.DateTimeField(auto_now_add=True,
+                                   db_index=True,
+                                   verbose_name='Добавлено')
+
+    objects = RelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'recipe'),
+            name='unique_%(class)s_user_and_recipe'
+        ),)
 
 
 class Favourites(FavoriteShoppingCartModel):
@@ -145,6 +382,84 @@ class ShoppingCart(FavoriteShoppingCartModel):
         verbose_name_plural = 'Корзина покупок'
 
 
+class ShoppingListQuerySet(models.QuerySet):
+    """Кверисет списка покупок."""
+
+    def refresh(self, user_ids, ingredient_ids=None):
+        """
+        Пересчёт списка покупок.
+
+        Заново суммирует количество ингредиентов по корзинам
+        пользователей. Если переданы ingredient_ids, пересчитываются
+        только строки этих ингредиентов.
+        """
+        totals = IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__user__in=user_ids)
+        stale = self.filter(user__in=user_ids)
+        if ingredient_ids is not None:
+            totals = totals.filter(ingredient__in=ingredient_ids)
+            stale = stale.filter(ingredient__in=ingredient_ids)
+        totals = totals.values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(pk__in=user_ids))
+            stale.delete()
+            self.bulk_create(
+                ShoppingListItem(user_id=row['recipe__shopping_cart__user'],
+                                 ingredient_id=row['ingredient'],
+                                 amount=row['total'])
+                for row in totals
+            )
+
+    def refresh_recipe(self, recipe_id, ingredient_ids=None):
+        """Пересчёт списков покупок у всех, чья корзина содержит рецепт."""
+        user_ids = list(ShoppingCart.objects.filter(
+            recipe=recipe_id).values_list('user', flat=True))
+        if user_ids:
+            self.refresh(user_ids, ingredient_ids)
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель Список покупок.
+
+    Суммарное количество ингредиента во всех рецептах корзины
+    пользователя, обновляется при изменении корзины и рецептов.
+    """
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='shopping_list',
+                                   verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'ingredient'),
+            name='unique_user_and_ingredient'
+        ),)
+        indexes = (
+            # Покрывающий индекс: количество читается без обращения
+            # к таблице. Отдельно от уникального ограничения, которое
+            # с include не создаётся на базах без его поддержки.
+            models.Index(fields=('user', 'ingredient'),
+                         include=('amount',),
+                         name='shopping_list_amount_idx'),
+        )
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self) -> str:
+        return f'{self.ingredient} - {self.amount}'
+
+
 class Subscribe(models.Model):
     """Модель Подписки."""
 
@@ -157,6 +472,8 @@ class Subscribe(models.Model):
                                related_name='following',
                                verbose_name='Автор')
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         constraints = (models.UniqueConstraint(
             fields=('user', 'author'),
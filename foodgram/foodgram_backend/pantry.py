@@ -0,0 +1,152 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from heapq import nlargest
+from threading import Lock
+
+from django.db.models import Case, FloatField, IntegerField, Value, When
+
+from foodgram.constants import (COOK_RESULTS_LIMIT, VERSION_CHECK_TTL,
+                                VERSION_CLOCK_MARGIN)
+
+from .models import DataVersion, IngredientInRecipe
+from .versions import data_versions
+
+VERSION_NAME = 'recipe_ingredients'
+
+
+class RecipeIngredients:
+    """
+    Снимок обратного индекса.
+
+    После создания снимок не меняется: обновление индекса собирает
+    новый снимок, а запрос до конца работает с тем, что получил.
+    """
+
+    def __init__(self, postings, ingredients):
+        self.postings, self.ingredients = postings, ingredients
+
+    @classmethod
+    def build(cls, rows):
+        postings, ingredients = {}, {}
+        for recipe, ingredient in rows:
+            postings.setdefault(ingredient, []).append(recipe)
+            ingredients.setdefault(recipe, []).append(ingredient)
+        return cls(postings, ingredients)
+
+    def replace(self, recipe_ids, rows):
+        """Новый снимок, где списки рецептов recipe_ids взяты из rows."""
+        fresh = type(self).build(rows)
+        postings, ingredients = dict(self.postings), dict(self.ingredients)
+        touched = set(fresh.postings)
+        for recipe in recipe_ids:
+            touched.update(ingredients.pop(recipe, ()))
+        ingredients.update(fresh.ingredients)
+        for ingredient in touched:
+            recipes = [recipe for recipe in postings.get(ingredient, ())
+                       if recipe not in recipe_ids]
+            recipes += fresh.postings.get(ingredient, [])
+            if recipes:
+                postings[ingredient] = recipes
+            else:
+                postings.pop(ingredient, None)
+        return type(self)(postings, ingredients)
+
+    def rank(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Возвращает словарь id рецепта → (доля имеющихся
+        ингредиентов, их число), не больше COOK_RESULTS_LIMIT
+        лучших по доле рецептов.
+        """
+        hits = Counter()
+        for ingredient in set(ingredient_ids):
+            hits.update(self.postings.get(ingredient, ()))
+        ranks = {recipe: (count / len(self.ingredients[recipe]), count)
+                 for recipe, count in hits.items()}
+        return dict(nlargest(COOK_RESULTS_LIMIT, ranks.items(),
+                             key=lambda item: item[1]))
+
+    def missing(self, recipe_id, ingredient_ids):
+        return [ingredient
+                for ingredient in self.ingredients.get(recipe_id, ())
+                if ingredient not in ingredient_ids]
+
+
+class IngredientRecipeIndex:
+    """
+    Обратный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Для подбора рецептов по имеющимся ингредиентам: рецепты-кандидаты
+    и число совпавших ингредиентов считаются по спискам индекса,
+    без соединений по IngredientInRecipe. Правка ингредиентов рецепта
+    поднимает общую версию recipe_ingredients и версию рецепта
+    recipe_ingredients:<id>. При смене общей версии перечитываются
+    только рецепты, чьи версии менялись с прошлой загрузки; запас
+    VERSION_CLOCK_MARGIN покрывает расхождение часов и поздние коммиты.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = self.modified = None
+        self.snapshot = RecipeIngredients({}, {})
+
+    def invalidate(self, recipe_ids):
+        data_versions.bump([VERSION_NAME, *(f'{VERSION_NAME}:{pk}'
+                                            for pk in recipe_ids)])
+
+    def get(self):
+        """Актуальный снимок индекса."""
+        version, modified = data_versions.get(VERSION_NAME,
+                                              VERSION_CHECK_TTL)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.update(version, modified)
+        return self.snapshot
+
+    def update(self, version, modified):
+        rows = IngredientInRecipe.objects.values_list('recipe', 'ingredient')
+        # Версия меньше загруженной — таблицу версий очистили.
+        if self.version is None or version < self.version:
+            self.snapshot = RecipeIngredients.build(rows.iterator())
+        else:
+            recipe_ids = self.changed_recipes()
+            self.snapshot = self.snapshot.replace(
+                recipe_ids, rows.filter(recipe__in=recipe_ids))
+        self.version, self.modified = version, modified
+
+    def changed_recipes(self):
+        prefix = f'{VERSION_NAME}:'
+        since = (datetime.fromtimestamp(self.modified, timezone.utc)
+                 - timedelta(seconds=VERSION_CLOCK_MARGIN))
+        names = DataVersion.objects.filter(
+            modified__gte=since, name__startswith=prefix
+        ).values_list('name', flat=True)
+        return {int(name[len(prefix):]) for name in names}
+
+
+ingredient_recipe_index = IngredientRecipeIndex()
+
+
+def cookable_recipes(queryset, index, ingredient_ids):
+    """
+    Рецепты из имеющихся ингредиентов.
+
+    Аннотирует coverage (доля ингредиентов рецепта, которые есть)
+    и matched (их число) по снимку индекса и сортирует по ним.
+    """
+    ranks = index.rank(ingredient_ids)
+    groups = {}
+    for recipe, rank in ranks.items():
+        groups.setdefault(rank, []).append(recipe)
+    return queryset.filter(pk__in=ranks).annotate(
+        coverage=Case(
+            *(When(pk__in=pks, then=Value(coverage))
+              for (coverage, _), pks in groups.items()),
+            default=Value(0.0), output_field=FloatField()),
+        matched=Case(
+            *(When(pk__in=pks, then=Value(matched))
+              for (_, matched), pks in groups.items()),
+            default=Value(0), output_field=IntegerField()),
+    ).order_by('-coverage', '-matched', '-pk')
@@ -0,0 +1,121 @@
+import re
+from heapq import nlargest
+from operator import itemgetter
+from threading import Lock
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from foodgram.constants import SEARCH_CONFIG, SEARCH_RESULTS_LIMIT
+
+from .models import Recipe
+from .versions import data_versions
+
+# Веса названия и описания, как у весов A и B в ts_rank.
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def is_postgresql(using):
+    return connections[using].vendor == 'postgresql'
+
+
+class RecipeSearchIndex:
+    """
+    Обратный индекс рецептов в памяти процесса.
+
+    Используется вместо tsvector на базах без полнотекстового
+    поиска (SQLite при разработке). Для каждого слова хранит вес
+    рецептов, в которых оно встречается; индекс перестраивается
+    целиком при смене версии recipe_search.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.postings = {}
+
+    def invalidate(self):
+        data_versions.bump(['recipe_search'])
+
+    def load(self):
+        version = data_versions.get('recipe_search')[0]
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            postings = {}
+            for pk, name, text in Recipe.objects.values_list(
+                    'pk', 'name', 'text').iterator():
+                for tokens, weight in ((tokenize(name), NAME_WEIGHT),
+                                       (tokenize(text), TEXT_WEIGHT)):
+                    for token in tokens:
+                        ranks = postings.setdefault(token, {})
+                        ranks[pk] = ranks.get(pk, 0) + weight
+            self.postings, self.version = postings, version
+
+    def search(self, query):
+        """Рецепты, содержащие все слова запроса, с их весом."""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return {}
+        self.load()
+        postings = sorted((self.postings.get(token, {}) for token in tokens),
+                          key=len)
+        ranks = postings[0]
+        for posting in postings[1:]:
+            ranks = {pk: rank + posting[pk] for pk, rank in ranks.items()
+                     if pk in posting}
+        return dict(nlargest(SEARCH_RESULTS_LIMIT, ranks.items(),
+                             key=itemgetter(1)))
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_vector():
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search(recipe):
+    """Обновляет поисковые данные после изменения рецепта."""
+    if is_postgresql(recipe._state.db):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            search_vector=search_vector())
+    else:
+        recipe_search_index.invalidate()
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов.
+
+    На PostgreSQL — по колонке search_vector с GIN-индексом,
+    иначе — по обратному индексу в памяти. Результаты
+    упорядочены по убыванию релевантности (аннотация rank).
+    """
+    if is_postgresql(queryset.db):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), search_query),
+                      FloatField())
+        ).order_by('-rank', '-pk')
+    ranks = recipe_search_index.search(query)
+    # Различных весов немного: одно условие на каждый вес.
+    groups = {}
+    for pk, rank in ranks.items():
+        groups.setdefault(rank, []).append(pk)
+    return queryset.filter(pk__in=ranks).annotate(rank=Case(
+        *(When(pk__in=pks, then=Value(rank)) for rank, pks in groups.items()),
+        default=Value(0.0), output_field=FloatField()
+    )).order_by('-rank', '-pk')
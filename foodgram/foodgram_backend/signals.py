@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from users.models import User
+
+from .catalogue import ingredient_catalogue
+from .images import delete_image
+from .models import (Favourites, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListItem, Subscribe)
+from .pantry import ingredient_recipe_index
+from .search import is_postgresql, recipe_search_index, update_search
+from .storage import lock_file_name
+
+COUNTERS = {
+    Favourites: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'cart_count'),
+    Subscribe: (User, 'author_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalogue(**kwargs):
+    ingredient_catalogue.invalidate()
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def refresh_shopping_list(instance, created=None, **kwargs):
+    """При изменении строки корзины пересчитываем весь список."""
+    ingredient_ids = None
+    if created is not False:
+        # При каскадном удалении рецепта его ингредиентов уже может
+        # не быть, тогда тоже пересчитываем весь список.
+        ingredient_ids = list(IngredientInRecipe.objects.filter(
+            recipe=instance.recipe_id
+        ).values_list('ingredient', flat=True)) or None
+    ShoppingListItem.objects.refresh([instance.user_id], ingredient_ids)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def refresh_shopping_lists_with_recipe(instance, created=None, **kwargs):
+    ShoppingListItem.objects.refresh_recipe(
+        instance.recipe_id,
+        None if created is False else [instance.ingredient_id]
+    )
+
+
+def release_image(name):
+    """Удаляет файл после коммита, если на него не ссылаются рецепты."""
+    def delete_unreferenced():
+        with transaction.atomic():
+            lock_file_name(name)
+            if not Recipe.objects.filter(image=name).exists():
+                delete_image(name)
+    if name:
+        transaction.on_commit(delete_unreferenced)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_previous_state(instance, **kwargs):
+    previous = instance.pk and Recipe.objects.filter(
+        pk=instance.pk).values('image', 'author').first()
+    instance.previous_image = previous and previous['image']
+    instance.previous_author = previous and previous['author']
+
+
+@receiver(post_save, sender=Recipe)
+def release_previous_image(instance, **kwargs):
+    if instance.previous_image != instance.image.name:
+        release_image(instance.previous_image)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик, не опуская его ниже нуля."""
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Recipe)
+def move_recipes_count(instance, created, **kwargs):
+    """При смене автора рецепт переходит в счётчик нового автора."""
+    if created or instance.previous_author == instance.author_id:
+        return
+    change_counter(User, instance.previous_author, 'recipes_count', -1)
+    change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, attname, field = COUNTERS[sender]
+        change_counter(model, getattr(instance, attname), field, 1)
+
+
+@receiver(post_delete, sender=Favourites)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    model, attname, field = COUNTERS[sender]
+    change_counter(model, getattr(instance, attname), field, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search(instance, **kwargs):
+    update_search(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_from_search(instance, **kwargs):
+    if not is_postgresql(instance._state.db):
+        recipe_search_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_ingredient_recipe_index(instance, **kwargs):
+    """Правка строк в админке и каскадное удаление рецепта."""
+    ingredient_recipe_index.invalidate([instance.recipe_id])
@@ -0,0 +1,43 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+
+
+def lock_file_name(name):
+    """
+    Блокировка имени файла до конца транзакции.
+
+    Сохранение, которое переиспользует файл, и удаление файла
+    без ссылок берут её до проверки, поэтому удаление дожидается
+    коммита рецепта с тем же файлом и видит его. Вне PostgreSQL
+    записи и так идут по одной.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [name])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище с адресацией по содержимому.
+
+    Файл называется хешем своего содержимого, поэтому одинаковые
+    загрузки сохраняются один раз и ссылаются на общий файл.
+    Сохранение выполняется в транзакции рецепта, который ссылается
+    на файл: блокировка имени держится до её коммита.
+    """
+
+    def save(self, name, content, max_length=None):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = os.path.join(directory, digest.hexdigest() + extension)
+        lock_file_name(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,115 @@
+from time import monotonic
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DataVersion
+
+
+class DataVersions:
+    """
+    Версии данных в таблице DataVersion.
+
+    Версия — пара из номера изменения и времени изменения.
+    Номера входят в ключи кешей и ETag, время — в Last-Modified.
+    Таблица общая для всех процессов, поэтому изменение, сделанное
+    в одном процессе (или командой manage.py), видят все остальные.
+    Новая версия записывается после коммита транзакции. Версию,
+    которая ещё не менялась, чтение не создаёт: она считается нулевой.
+
+    Прочитанные версии запоминаются в процессе. С ненулевым ttl
+    чтение берёт их из памяти, пока им меньше ttl секунд: изменения
+    других процессов видны с такой задержкой, свои — сразу.
+    """
+
+    def __init__(self):
+        self.read = {}
+
+    def get_cached(self, names, ttl):
+        """Версии из памяти процесса или None, если какая-то устарела."""
+        deadline = monotonic() - ttl
+        versions = {}
+        for name in names:
+            read_at, version = self.read.get(name, (deadline, None))
+            if read_at <= deadline:
+                return None
+            versions[name] = version
+        return versions
+
+    def get_many(self, names, ttl=0):
+        if ttl:
+            versions = self.get_cached(names, ttl)
+            if versions is not None:
+                return versions
+        read_at = monotonic()
+        rows = {
+            name: (version, modified.timestamp())
+            for name, version, modified in DataVersion.objects.filter(
+                name__in=names).values_list('name', 'version', 'modified')
+        }
+        versions = {name: rows.get(name, (0, 0.0)) for name in names}
+        for name, version in versions.items():
+            self.read[name] = (read_at, version)
+        return versions
+
+    def get(self, name, ttl=0):
+        return self.get_many([name], ttl)[name]
+
+    def bump(self, names):
+        """
+        Новые версии после коммита.
+
+        В одном блоке atomic версии копятся в общем наборе и
+        записываются один раз, сколько бы строк ни поменялось.
+        """
+        names = set(names)
+        if not names:
+            return
+        connection = transaction.get_connection()
+        pending = getattr(connection, 'pending_versions', None)
+        # None — блок atomic без точки сохранения, его откат
+        # невозможен отдельно от внешнего блока.
+        savepoints = set(connection.savepoint_ids) - {None}
+        if any(callback is pending and sids - {None} == savepoints
+               for sids, callback in connection.run_on_commit):
+            pending.names |= names
+            return
+        pending = connection.pending_versions = PendingVersions(self, names)
+        transaction.on_commit(pending)
+
+    def increment(self, names):
+        try:
+            self.write(names)
+        finally:
+            for name in names:
+                self.read.pop(name, None)
+
+    @transaction.atomic
+    def write(self, names):
+        modified = timezone.now()
+        rows = DataVersion.objects.filter(name__in=names)
+        if rows.update(version=F('version') + 1,
+                       modified=modified) == len(names):
+            return
+        missing = names - set(rows.values_list('name', flat=True))
+        # Строки, которые успел создать другой процесс, пропускаются
+        # при вставке и увеличиваются следующим UPDATE.
+        DataVersion.objects.bulk_create(
+            (DataVersion(name=name, version=0, modified=modified)
+             for name in missing), ignore_conflicts=True)
+        DataVersion.objects.filter(name__in=missing).update(
+            version=F('version') + 1, modified=modified)
+
+
+class PendingVersions:
+    """Версии, которые поднимутся после коммита транзакции."""
+
+    def __init__(self, versions, names):
+        self.versions, self.names = versions, names
+
+    def __call__(self):
+        self.versions.increment(self.names)
+
+
+data_versions = DataVersions()
@@ -0,0 +1,2 @@
+bind = '0:8000'
+wsgi_app = 'foodgram.wsgi:application'
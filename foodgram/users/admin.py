@@ -8,5 +8,6 @@ from .models import User
 class MyUserAdmin(UserAdmin):
 
     list_display = ('email', 'first_name',
-                    'last_name',)
+                    'last_name', 'recipes_count', 'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
     list_filter = ('email', 'first_name')
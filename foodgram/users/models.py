@@ -5,7 +5,28 @@ from django.db import models
 from foodgram.constants import MAIL_LENGTH, NAME_LENGTH
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """
+    Модель со счётчиками.
+
+    Счётчики меняются только выражениями F() в сигналах
+    и командами пересчёта, поэтому при обычном сохранении записи
+    их не перезаписываем.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField(max_length=MAIL_LENGTH,
                               verbose_name='Почта',
                               unique=True)
@@ -18,6 +39,12 @@ class User(AbstractUser):
                                   verbose_name='Имя')
     second_name = models.CharField(max_length=NAME_LENGTH,
                                    verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(default=0,
+                                                verbose_name='Рецептов')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписчиков')
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']